@@ -1,5 +1,7 @@
 import click
 
+from ecstools.lib.paginate import paginate
+
 
 @click.command()
 @click.option('-A', '--arn', is_flag=True, help='Show ARN')
@@ -7,8 +9,9 @@ import click
 def ls(ctx, arn):
     """List clusters"""
     ecs = ctx.obj['ecs']
-    res = ecs.list_clusters()
-    clusters = res['clusterArns']
+    cache = ctx.obj['cache']
+    clusters = cache.iterate('clusters', 'all', lambda: paginate(
+        ecs.list_clusters, 'clusterArns'))
 
     if not arn:
         clusters = map(lambda x: x.split('/')[-1], clusters)
@@ -0,0 +1,27 @@
+import click
+
+import ecstools.lib.utils as utils
+from ecstools.commands.service.ls import list_services
+
+
+@click.command()
+@click.argument('cluster')
+@click.option('-i', '--interval', type=float, default=1, show_default=True,
+              help='Seconds between monitor updates')
+@click.pass_context
+def top(ctx, cluster, interval):
+    """Monitor all services in a cluster
+
+    |\b
+    Services with failed or in progress deployments and services running
+    fewer tasks than desired are listed first. Select a service with the
+    arrow keys and press Enter to see its deployments.
+    """
+    ecs = ctx.obj['ecs']
+    elbv2 = ctx.obj['elbv2']
+
+    def service_names():
+        return [s.split('/')[-1] for s in list_services(ecs, cluster)]
+
+    utils.monitor_cluster(ecs, elbv2, cluster, service_names,
+                          interval=interval)
@@ -1,47 +1,265 @@
 import sys
 import click
+import threading
 
-from ecstools.resources.service import Service
+from concurrent.futures import ThreadPoolExecutor
+
+from ecstools.lib.manifest import load_manifest
+from ecstools.resources.ecr import Ecr
+from ecstools.resources.service import Service, describe_services
+from ecstools.resources.task_definition import TaskDefinition
 import ecstools.lib.utils as utils
 
 
 @click.command(short_help='Deploy service')
-@click.argument('cluster')
-@click.argument('service')
+@click.argument('cluster', required=False)
+@click.argument('service', required=False)
 @click.argument('tags', nargs=-1)
 @click.option('-g', '--group', is_flag=True, help='Run group deployment')
+@click.option('-f', '--manifest', type=click.Path(dir_okay=False),
+              help='Deploy the services of a fleet manifest')
+@click.option('-m', '--max-parallel', type=click.IntRange(1), default=4,
+              show_default=True,
+              help='Number of group services deployed at the same time')
 @click.option('-c', '--count', type=int, default=None,
               help='Update the current number of tasks')
 @click.option('-v', '--verbose', is_flag=True, help='Verbose mode')
+@click.option('-i', '--interval', type=float, default=1, show_default=True,
+              help='Seconds between monitor updates')
+@click.option('-o', '--output', type=click.Choice(['tui', 'jsonl']),
+              default='tui', show_default=True,
+              help='Monitor output. jsonl prints a JSON record per state '
+              'change and does not need a terminal')
 @click.pass_context
-def deploy(ctx, cluster, service, tags, group, count, verbose):
+def deploy(ctx, cluster, service, tags, group, manifest, max_parallel, count,
+           verbose, interval, output):
     """Deploy a task definition to a service
 
     |\b
     The deployment respects the current number of tasks in the service.
     Use '-c' to scale in or out during deploy.
+
+    |\b
+    $ ecs service deploy --manifest fleet.yaml
+    deploys the services of a fleet manifest across clusters in waves.
     """
+    if manifest:
+        if cluster or service or group:
+            click.echo('Error: A manifest deployment takes no cluster, '
+                       'service or group.', err=True)
+            sys.exit(1)
+        run_fleet_deployment(ctx, load_manifest(manifest), count, verbose,
+                             interval, output)
+        return
+
+    if not cluster or not service:
+        click.echo('Error: Specify a cluster and a service.', err=True)
+        sys.exit(1)
+
     if len(tags) == 0:
         click.echo('Error: Specify one or more tags to be deployed.', err=True)
         sys.exit(1)
 
+    failed = []
     if group:
         services = utils.get_group_services(service)
-        service = run_group_deployment(ctx, cluster, services, tags,
-                                       count, verbose)
+        service, failed = run_group_deployment(ctx, cluster, services, tags,
+                                               count, verbose, max_parallel)
+        if not service:
+            utils.print_failed_deployments(failed)
+            sys.exit(1)
     else:
         deploy_service(ctx, cluster, service, tags, count, verbose)
 
-    utils.monitor_deployment(ctx.obj['ecs'], ctx.obj['elbv2'],
-                             cluster, service, exit_on_complete=True)
+    try:
+        utils.monitor_deployment(ctx.obj['ecs'], ctx.obj['elbv2'],
+                                 cluster, service, interval=interval,
+                                 output=output, exit_on_complete=True)
+    finally:
+        # Repeat the failures once the monitor has released the terminal
+        utils.exit_if_failed(failed)
 
 
-def deploy_service(ctx, cluster, service, tags, count, verbose):
-    srv = Service(ctx.obj['ecs'], ctx.obj['ecr'], cluster, service)
+def deploy_service(ctx, cluster, service, tags, count, verbose,
+                   description=None):
+    srv = Service(ctx.obj['ecs'], ctx.obj['ecr'], cluster, service,
+                  description=description)
     srv.deploy_tags(tags, count, verbose)
 
 
-def run_group_deployment(ctx, cluster, services, tags, count, verbose):
-    for srv in services:
-        deploy_service(ctx, cluster, srv, tags, count, verbose)
-    return services
+def run_group_deployment(ctx, cluster, services, tags, count, verbose,
+                         max_parallel=1):
+    """
+    Deploy the services of a group with up to `max_parallel` deployments
+    in flight. A failing service does not stop the others.
+    Returns the lists of deployed and failed services.
+    """
+    workers = min(max_parallel, len(services))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        descriptions, prefetch_failed = prefetch_image_digests(
+            ctx, [(cluster, srv, tags) for srv in services], pool)
+        remaining = [srv for srv in services
+                     if (cluster, srv) not in prefetch_failed]
+        results = dict(zip(remaining, pool.map(
+            lambda srv: try_deploy_service(
+                ctx, cluster, srv, tags, count, verbose,
+                descriptions.get((cluster, srv))),
+            remaining)))
+
+    deployed = [srv for srv in services if results.get(srv)]
+    failed = [srv for srv in services if not results.get(srv)]
+    return deployed, failed
+
+
+def run_fleet_deployment(ctx, manifest, count, verbose, interval, output):
+    """
+    Deploy the targets of a manifest wave by wave. A wave starts once the
+    deployments of the previous wave completed, which they have to within
+    the wave timeout. A failure stops the rollout before the next wave.
+    Progress is printed while waiting. All deployed services are
+    monitored in one session at the end.
+    """
+    waves = manifest.waves()
+    deployed = []
+    failed = []
+    for number, wave in enumerate(waves, start=1):
+        if len(waves) > 1:
+            click.echo('Wave %s/%s: %s' % (
+                number, len(waves), ', '.join(t.name() for t in wave)),
+                err=True)
+        wave_deployed, wave_failed = run_wave(ctx, manifest, wave, count,
+                                              verbose)
+        deployed.extend(wave_deployed)
+        failed.extend(wave_failed)
+        if failed:
+            break
+        if number < len(waves) and not utils.wait_for_deployments(
+                ctx.obj['ecs'], [(t.cluster, t.service) for t in wave],
+                interval, timeout=manifest.wave_timeout, output=output):
+            failed.extend('%s (rollout)' % t.name() for t in wave)
+            break
+
+    skipped = [t.name() for w in waves for t in w
+               if t.name() not in deployed and t.name() not in failed]
+    if skipped:
+        click.echo('Error: Not deployed because of the failures: %s.' %
+                   ', '.join(skipped), err=True)
+    if not deployed:
+        utils.print_failed_deployments(failed)
+        sys.exit(1)
+
+    try:
+        utils.monitor_fleet_deployment(
+            ctx.obj['ecs'], ctx.obj['elbv2'],
+            [tuple(name.split('/', 1)) for name in deployed],
+            interval=interval, output=output, exit_on_complete=True)
+    finally:
+        utils.exit_if_failed(failed)
+
+
+def run_wave(ctx, manifest, wave, count, verbose):
+    """
+    Deploy the targets of a wave concurrently, with at most the limit of
+    each cluster in flight per cluster.
+    Returns the lists of deployed and failed target names.
+    """
+    limits = dict((t.cluster, manifest.cluster_limit(t.cluster))
+                  for t in wave)
+    slots = dict((cluster, threading.BoundedSemaphore(limit))
+                 for cluster, limit in limits.items())
+
+    def deploy_target(target):
+        with slots[target.cluster]:
+            return try_deploy_service(
+                ctx, target.cluster, target.service, target.tags, count,
+                verbose, descriptions.get((target.cluster, target.service)))
+
+    with ThreadPoolExecutor(max_workers=sum(limits.values())) as pool:
+        descriptions, prefetch_failed = prefetch_image_digests(
+            ctx, [(t.cluster, t.service, t.tags) for t in wave], pool)
+        remaining = [t for t in wave
+                     if (t.cluster, t.service) not in prefetch_failed]
+        results = dict((t.name(), ok) for t, ok in zip(
+            remaining, pool.map(deploy_target, remaining)))
+
+    deployed = [t.name() for t in wave if results.get(t.name())]
+    failed = [t.name() for t in wave if not results.get(t.name())]
+    return deployed, failed
+
+
+def prefetch_image_digests(ctx, targets, pool):
+    """
+    Describe the (cluster, service, tags) `targets` and resolve the digests
+    of all their images with one describe_images call per repository, so
+    the service deployments find them in the image digest cache.
+    Returns the service descriptions keyed by (cluster, service), and the
+    set of (cluster, service) pairs whose task definition could not be
+    fetched.
+    """
+    ecs = ctx.obj['ecs']
+    ecr = ctx.obj['ecr']
+    descriptions = {}
+    for cluster in sorted(set(t[0] for t in targets)):
+        services = [t[1] for t in targets if t[0] == cluster]
+        for name, description in describe_services(
+                ecs, cluster, services, missing_ok=True).items():
+            descriptions[(cluster, name)] = description
+
+    found = [t for t in targets if (t[0], t[1]) in descriptions]
+
+    def fetch_task_definition(arn):
+        from botocore.exceptions import ClientError
+        try:
+            return TaskDefinition(ecs, arn)
+        except SystemExit:
+            # The task definition prints the reason before exiting
+            return None
+        except ClientError as e:
+            click.echo('%s: %s' % (arn, e), err=True)
+            return None
+
+    # Services sharing a revision describe it once
+    task_definitions = {}
+    for cluster, service, _ in found:
+        arn = descriptions[(cluster, service)]['taskDefinition']
+        if arn not in task_definitions:
+            task_definitions[arn] = pool.submit(fetch_task_definition, arn)
+
+    def digest_requests(target):
+        cluster, service, tags = target
+        description = descriptions[(cluster, service)]
+        if task_definitions[description['taskDefinition']].result() is None:
+            return None
+        srv = Service(ecs, ecr, cluster, service, description=description)
+        try:
+            # The task definition is cached by now
+            return srv.image_digest_requests(tags)
+        except SystemExit:
+            return None
+
+    requests = []
+    failed = set()
+    for target in found:
+        images = digest_requests(target)
+        if images is None:
+            failed.add(target[:2])
+        else:
+            requests.extend(images)
+    Ecr(ecr).resolve_digests(requests, missing_ok=True)
+    return descriptions, failed
+
+
+def try_deploy_service(ctx, cluster, service, tags, count, verbose,
+                       description=None):
+    """Returns False if the service could not be deployed"""
+    from botocore.exceptions import ClientError
+    try:
+        deploy_service(ctx, cluster, service, tags, count, verbose,
+                       description)
+    except SystemExit:
+        # The resources print the reason before exiting
+        return False
+    except ClientError as e:
+        click.echo('%s: %s' % (service, e), err=True)
+        return False
+    return True
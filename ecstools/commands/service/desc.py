@@ -1,6 +1,6 @@
 import click
 
-from ecstools.resources.service import Service
+from ecstools.resources.service import Service, describe_services
 import ecstools.lib.utils as utils
 
 
@@ -13,12 +13,15 @@ def desc(ctx, cluster, service):
     ecs = ctx.obj['ecs']
     ecr = ctx.obj['ecr']
     elbv2 = ctx.obj['elbv2']
+    cache = ctx.obj['cache']
 
-    srv = Service(ecs, ecr, cluster, service)
+    description = describe_services(ecs, cluster, [service],
+                                    cache=cache)[service]
+    srv = Service(ecs, ecr, cluster, service, description=description)
 
     print_service_general_info(srv)
     print_service_container_info(srv)
-    print_service_load_balancer_info(srv, elbv2)
+    print_service_load_balancer_info(srv, elbv2, cache)
     print_service_network_info(srv)
 
 
@@ -46,13 +49,12 @@ def print_service_container_info(srv):
         click.echo('%s:%s' % (img['image'], img['tag']))
 
 
-def print_service_load_balancer_info(srv, elbv2):
-    for lb in srv.service()['loadBalancers']:
-        if 'targetGroupArn' in lb:
-            tg_info = utils.describe_target_group_info(elbv2, lb)
-            click.echo(
-                'Target Group:     ' +
-                '{group} {container} {port} {states}'.format(**tg_info))
+def print_service_load_balancer_info(srv, elbv2, cache=None):
+    target_health = utils.collect_target_health(elbv2, [srv], cache)
+    for tg_info in target_health[srv.arn()]:
+        click.echo(
+            'Target Group:     ' +
+            '{group} {container} {port} {states}'.format(**tg_info))
 
 
 def print_service_network_info(srv):
@@ -1,9 +1,13 @@
 import click
 import sys
 import copy
+import json
 import six
 
-from ecstools.resources.service import Service
+from concurrent.futures import ThreadPoolExecutor
+
+from ecstools.resources.service import Service, describe_services, \
+    print_registration
 import ecstools.lib.utils as utils
 
 
@@ -14,8 +18,25 @@ import ecstools.lib.utils as utils
 @click.option('-d', '--delete', is_flag=True,
               help='Delete environment variable')
 @click.option('-g', '--group', is_flag=True, help='Update service group')
+@click.option('-c', '--container',
+              help='Container to update. Services with several containers '
+              'ask for it otherwise')
+@click.option('-f', '--env-file', type=click.Path(dir_okay=False),
+              help='Read KEY=VALUE pairs from a .env file or a JSON object')
+@click.option('-m', '--max-parallel', type=click.IntRange(1), default=4,
+              show_default=True,
+              help='Number of group services updated at the same time')
+@click.option('-y', '--yes', is_flag=True,
+              help='Deploy the changes without asking')
+@click.option('-i', '--interval', type=float, default=1, show_default=True,
+              help='Seconds between monitor updates')
+@click.option('-o', '--output', type=click.Choice(['tui', 'jsonl']),
+              default='tui', show_default=True,
+              help='Monitor output. jsonl prints a JSON record per state '
+              'change and does not need a terminal')
 @click.pass_context
-def env(ctx, cluster, service, pairs, delete, group):
+def env(ctx, cluster, service, pairs, delete, group, container, env_file,
+        max_parallel, yes, interval, output):
     """Manage environment variables
 
     |\b
@@ -24,46 +45,76 @@ def env(ctx, cluster, service, pairs, delete, group):
 
     # Set environment variables
     $ ecs service env CLUSTER SERVICE KEY1=VALUE1 KEY2=VALUE2 ...
+
+    # Set environment variables of a group from a file without prompts
+    $ ecs service env CLUSTER GROUP -g -c CONTAINER -f .env -y
     """
     ecs = ctx.obj['ecs']
     ecr = ctx.obj['ecr']
     elbv2 = ctx.obj['elbv2']
 
+    pairs = list(pairs)
+    if env_file:
+        pairs.extend(read_env_file(env_file))
+
     srv_names = [service]
     if group:
         srv_names = utils.get_group_services(service)
 
     services = bulk_update_service_variables(ecs, ecr, cluster, srv_names,
-                                             pairs, delete)
+                                             pairs, delete, container,
+                                             max_parallel)
 
     if not any([s['pending_deploy'] for s in services]):
         sys.exit(0)
 
-    confirm_input('Do you want to deploy your changes? ')
-    bulk_deploy_service(services)
-
-    utils.monitor_deployment(ecs, elbv2, cluster, srv_names,
-                             exit_on_complete=True)
+    if not yes:
+        confirm_input('Do you want to deploy your changes? ')
+    deployed, failed = bulk_deploy_service(services, max_parallel)
+    if not deployed:
+        utils.print_failed_deployments(failed)
+        sys.exit(1)
 
+    try:
+        utils.monitor_deployment(ecs, elbv2, cluster, deployed,
+                                 interval=interval, output=output,
+                                 exit_on_complete=True)
+    finally:
+        # Repeat the failures once the monitor has released the terminal
+        utils.exit_if_failed(failed)
 
-def bulk_update_service_variables(ecs, ecr, cluster, srv_names, pairs, delete):
-    services = []
-    for service in srv_names:
-        srv = update_service_variables(ecs, ecr, cluster, service,
-                                       pairs, delete)
-        services.append(srv)
 
-    return services
+def bulk_update_service_variables(ecs, ecr, cluster, srv_names, pairs, delete,
+                                  container_name=None, max_parallel=1):
+    """
+    Describe the services and their task definitions concurrently, then
+    print the changes of every service in the order of `srv_names`.
+    """
+    descriptions = describe_services(ecs, cluster, srv_names)
+    srvs = [Service(ecs, ecr, cluster, name, description=descriptions[name])
+            for name in srv_names]
+    with ThreadPoolExecutor(max_workers=min(max_parallel,
+                                            len(srvs))) as pool:
+        list(pool.map(lambda srv: srv.task_definition(), srvs))
 
+    return [update_service_variables(srv, pairs, delete, container_name)
+            for srv in srvs]
 
-def update_service_variables(ecs, ecr, cluster, service, pairs, delete):
-    srv = Service(ecs, ecr, cluster, service)
 
+def update_service_variables(srv, pairs, delete, container_name=None):
     click.secho('Current task definition for {} {}: {}'.format(
-                cluster, service, srv.task_definition().revision()
+                srv.cluster(), srv.name(), srv.task_definition().revision()
                 ), fg='blue')
 
-    container = container_selection(srv.task_definition().containers())
+    if container_name:
+        container = srv.task_definition().find_container_by_name(
+            container_name)
+        if container is None:
+            click.echo('Container %s not found in %s.' %
+                       (container_name, srv.name()), err=True)
+            sys.exit(1)
+    else:
+        container = container_selection(srv.task_definition().containers())
     click.secho(('\n==> Container: %s' % container['name']), fg='white')
 
     # Just print env vars if none were passed
@@ -86,18 +137,108 @@ def update_service_variables(ecs, ecr, cluster, service, pairs, delete):
     }
 
 
-def bulk_deploy_service(services):
-    for service in services:
-        if service['pending_deploy']:
-            deploy_service(service)
+def bulk_deploy_service(services, max_parallel=1):
+    """
+    Register and deploy the pending services concurrently. A failing
+    service does not stop the others.
+    Returns the lists of deployed and failed service names.
+    """
+    pending = [s for s in services if s['pending_deploy']]
+    with ThreadPoolExecutor(max_workers=min(max_parallel,
+                                            len(pending))) as pool:
+        results = list(pool.map(try_deploy_service, pending))
+
+    deployed = []
+    failed = []
+    for service, result in zip(pending, results):
+        srv = service['srv']
+        if result is None:
+            failed.append(srv.name())
+            continue
+        td, reused = result
+        print_registration(td, reused)
+        click.secho('Deploying %s to %s %s...' % (
+            td.revision(), srv.cluster(), srv.name()), fg='blue')
+        deployed.append(srv.name())
+    return deployed, failed
+
+
+def try_deploy_service(service):
+    """Returns the result of deploy_service or None if it failed"""
+    from botocore.exceptions import ClientError
+    try:
+        return deploy_service(service)
+    except SystemExit:
+        # The resources print the reason before exiting
+        return None
+    except ClientError as e:
+        click.echo('%s: %s' % (service['srv'].name(), e), err=True)
+        return None
 
 
 def deploy_service(service):
+    """
+    Returns the deployed task definition and whether it was reused
+    """
     td_dict = service['srv'].update_container_environment(
         service['container'],
         service['new_envs'])
-    td = service['srv'].register_task_definition(td_dict, verbose=True)
-    service['srv'].deploy_task_definition(td, verbose=True)
+    td, reused = service['srv'].find_or_register_task_definition(td_dict)
+    service['srv'].deploy_task_definition(td, verbose=False)
+    return td, reused
+
+
+def read_env_file(path):
+    """
+    Returns the KEY=VALUE pairs of a .env file, or of a JSON object when
+    the path ends with .json
+    """
+    try:
+        with open(path) as f:
+            content = f.read()
+    except (IOError, OSError) as e:
+        click.echo('Cannot read env file: %s' % e, err=True)
+        sys.exit(1)
+
+    if path.endswith('.json'):
+        try:
+            variables = json.loads(content)
+        except ValueError:
+            variables = None
+        if not isinstance(variables, dict):
+            click.echo('The env file needs a JSON object of variables.',
+                       err=True)
+            sys.exit(1)
+        pairs = []
+        for key, value in variables.items():
+            if isinstance(value, (dict, list)):
+                click.echo('The value of %s in the env file has to be a '
+                           'string, number, boolean or null.' % key,
+                           err=True)
+                sys.exit(1)
+            if not isinstance(value, six.string_types):
+                # true, 1.5 and null as written in the file
+                value = json.dumps(value)
+            pairs.append('%s=%s' % (key, value))
+        return pairs
+
+    pairs = []
+    for number, line in enumerate(content.splitlines(), 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if line.startswith('export '):
+            line = line[len('export '):].lstrip()
+        key, sep, value = line.partition('=')
+        if not sep:
+            click.echo('Not a valid pair in %s line %s: %s' %
+                       (path, number, line), err=True)
+            sys.exit(1)
+        value = value.strip()
+        if len(value) > 1 and value[0] == value[-1] and value[0] in '"\'':
+            value = value[1:-1]
+        pairs.append('%s=%s' % (key.strip(), value))
+    return pairs
 
 
 def confirm_input(text):
@@ -144,43 +285,49 @@ def update_environment_variables(container, pairs, delete):
         return set_environment_variables(pairs, envs)
 
 
+def env_index(envs):
+    """Returns the environment variables by name"""
+    index = {}
+    for e in envs:
+        index.setdefault(e['name'], e)
+    return index
+
+
 def delete_environment_variables(pairs, envs):
+    index = env_index(envs)
+    deleted = set()
     for pair in pairs:
         key = pair.split('=', 1)[0]
-        for e in envs:
-            if key == e['name']:
-                click.echo('- %s=%s' % (e['name'], e['value']))
-                envs.remove(e)
-    return envs
+        if key in index and key not in deleted:
+            click.echo('- %s=%s' % (key, index[key]['value']))
+            deleted.add(key)
+    return [e for e in envs if e['name'] not in deleted]
 
 
 def set_environment_variables(pairs, envs):
     # Update env var if it exist. Otherwise append it.
     validate_pairs(pairs)
 
+    index = env_index(envs)
     for pair in pairs:
         key, value = pair.split('=', 1)
-        envs, matched = update_env(envs, key, value)
-        if not matched:
-            envs = add_env(envs, key, value)
+        if key in index:
+            update_env(index[key], key, value)
+        else:
+            index[key] = add_env(envs, key, value)
     return envs
 
 
 def add_env(envs, key, value):
     click.echo('+ %s=%s' % (key, value))
-    envs.append({'name': key, 'value': value})
-    return envs
+    env = {'name': key, 'value': value}
+    envs.append(env)
+    return env
 
 
-def update_env(envs, key, value):
-    matched = False
-    for env in envs:
-        if key == env['name']:
-            print_env_value_diff(env, key, value)
-            env['value'] = value
-            matched = True
-            break
-    return envs, matched
+def update_env(env, key, value):
+    print_env_value_diff(env, key, value)
+    env['value'] = value
 
 
 def print_env_value_diff(env, key, value):
@@ -0,0 +1,70 @@
+import sys
+import time
+import click
+
+from ecstools.lib.poller import ServicePoller, PollInterval, EventTail, \
+    DESCRIBED_EVENTS
+from ecstools.lib.throttling import is_throttling_error
+import ecstools.lib.utils as utils
+
+
+@click.command(short_help='Show service events')
+@click.argument('cluster')
+@click.argument('services', nargs=-1, required=True)
+@click.option('-g', '--group', is_flag=True, help='Show service group events')
+@click.option('-n', '--num', type=click.IntRange(1, DESCRIBED_EVENTS),
+              default=10, show_default=True,
+              help='Number of past events per service')
+@click.option('-f', '--follow', is_flag=True,
+              help='Keep printing new events as they arrive')
+@click.option('-i', '--interval', type=float, default=5, show_default=True,
+              help='Seconds between polls with --follow')
+@click.pass_context
+def events(ctx, cluster, services, group, num, follow, interval):
+    """Show service events
+
+        |\b
+        $ ecs service events <cluster> <service>...
+
+        |\b
+        $ ecs service events <cluster> <service> -f
+    """
+    ecs = ctx.obj['ecs']
+
+    services = list(services)
+    if group:
+        services = [s for g in services for s in utils.get_group_services(g)]
+
+    poller = ServicePoller(ecs, cluster, services)
+    poll_interval = PollInterval(interval)
+    tail = EventTail(backlog=num)
+    from botocore.exceptions import ClientError
+    try:
+        while True:
+            try:
+                snapshots = poller.poll()
+            except ClientError as e:
+                if not is_throttling_error(e):
+                    raise
+                time.sleep(poll_interval.throttled())
+                continue
+
+            new = [(e, srv.name()) for srv in snapshots
+                   for e in tail.update(srv)]
+            new.sort(key=lambda x: x[0]['createdAt'])
+            for e, name in new:
+                print_event(e, name if len(services) > 1 else None)
+
+            if not follow:
+                return
+            time.sleep(poll_interval.next(bool(new)))
+    except KeyboardInterrupt:
+        sys.exit(0)
+
+
+def print_event(event, service=None):
+    date = event['createdAt'].replace(microsecond=0)
+    if service:
+        click.echo('%s %s: %s' % (date, service, event['message']))
+    else:
+        click.echo('%s %s' % (date, event['message']))
@@ -1,9 +1,16 @@
 import click
 import sys
 
-from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
 
-from ecstools.resources.service import Service
+from ecstools.lib.paginate import paginate
+from ecstools.resources.service import Service, describe_services, \
+    DESCRIBE_SERVICES_BATCH_SIZE
+from ecstools.resources.task_definition import TaskDefinition
+
+
+# Upper bound on concurrent describe calls with --all-stats
+ALL_STATS_WORKERS = 8
 
 
 @click.command()
@@ -15,23 +22,29 @@ def ls(ctx, cluster, all_stats, arn):
     """List services"""
     ecs = ctx.obj['ecs']
     ecr = ctx.obj['ecr']
+    cache = ctx.obj['cache']
 
-    services = list_services(ecs, cluster)
+    services = cache.iterate('services', cluster,
+                             lambda: list_services(ecs, cluster))
 
     if not arn:
         services = sorted(map(lambda x: x.split('/')[-1], services))
 
+    if all_stats and not arn:
+        print_services_info(ecs, ecr, cluster, services, cache)
+        return
+
     for srv in services:
-        if all_stats and not arn:
-            service = Service(ecs, ecr, cluster, srv)
-            print_service_info(service)
-        else:
-            click.echo(srv)
+        click.echo(srv)
 
 
 def list_services(ecs, cluster):
+    """Yields the service ARNs of a cluster page by page"""
+    from botocore.exceptions import ClientError
     try:
-        response = ecs.list_services(cluster=cluster, maxResults=100)
+        for service in paginate(ecs.list_services, 'serviceArns',
+                                cluster=cluster, maxResults=100):
+            yield service
     except ClientError as e:
         if e.response['Error']['Code'] == 'ClusterNotFoundException':
             click.echo('Cluster not found.', err=True)
@@ -39,18 +52,36 @@ def list_services(ecs, cluster):
             click.echo(e, err=True)
         sys.exit(1)
 
-    services = response['serviceArns']
-    while True:
-        if 'nextToken' not in response:
-            break
-        response = ecs.list_services(
-            cluster=cluster,
-            maxResults=100,
-            nextToken=response['nextToken']
-        )
-        services += response['serviceArns']
-
-    return services
+
+def print_services_info(ecs, ecr, cluster, services, cache=None):
+    """
+    Describe services in batches and their task definitions concurrently.
+    Each task definition is described once. Rows are printed in order as
+    soon as their batch is resolved.
+    """
+    batches = [services[i:i + DESCRIBE_SERVICES_BATCH_SIZE]
+               for i in range(0, len(services), DESCRIBE_SERVICES_BATCH_SIZE)]
+    task_definitions = {}
+
+    with ThreadPoolExecutor(max_workers=ALL_STATS_WORKERS) as pool:
+        described = [pool.submit(describe_services, ecs, cluster, batch,
+                                 cache=cache)
+                     for batch in batches]
+
+        for batch, future in zip(batches, described):
+            descriptions = future.result()
+            for d in descriptions.values():
+                arn = d['taskDefinition']
+                if arn not in task_definitions:
+                    task_definitions[arn] = pool.submit(TaskDefinition,
+                                                        ecs, arn)
+
+            for srv in batch:
+                description = descriptions[srv]
+                task_definitions[description['taskDefinition']].result()
+                service = Service(ecs, ecr, cluster, srv,
+                                  description=description)
+                print_service_info(service)
 
 
 def print_service_info(srv):
@@ -8,8 +8,14 @@ import ecstools.lib.utils as utils
 @click.argument('cluster')
 @click.argument('service')
 @click.argument('count', type=int)
+@click.option('-i', '--interval', type=float, default=1, show_default=True,
+              help='Seconds between monitor updates')
+@click.option('-o', '--output', type=click.Choice(['tui', 'jsonl']),
+              default='tui', show_default=True,
+              help='Monitor output. jsonl prints a JSON record per state '
+              'change and does not need a terminal')
 @click.pass_context
-def scale(ctx, cluster, service, count):
+def scale(ctx, cluster, service, count, interval, output):
     """Scale service"""
     ecs = ctx.obj['ecs']
     ecr = ctx.obj['ecr']
@@ -24,5 +30,5 @@ def scale(ctx, cluster, service, count):
 
     }
     srv.update_service(**params)
-    utils.monitor_deployment(ecs, elbv2, cluster, service,
-                             exit_on_complete=True)
+    utils.monitor_deployment(ecs, elbv2, cluster, service, interval=interval,
+                             output=output, exit_on_complete=True)
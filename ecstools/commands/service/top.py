@@ -11,8 +11,14 @@ from ecstools.lib.config import config
 @click.option('-g', '--group', is_flag=True, help='Monitor service group')
 @click.option('-e', '--exit-on-complete', is_flag=True, help='Exit when all'
               ' deployments are completed')
+@click.option('-i', '--interval', type=float, default=1, show_default=True,
+              help='Seconds between monitor updates')
+@click.option('-o', '--output', type=click.Choice(['tui', 'jsonl']),
+              default='tui', show_default=True,
+              help='Monitor output. jsonl prints a JSON record per state '
+              'change and does not need a terminal')
 @click.pass_context
-def top(ctx, cluster, service, group, exit_on_complete):
+def top(ctx, cluster, service, group, exit_on_complete, interval, output):
     """Monitor service"""
     ecs = ctx.obj['ecs']
     elbv2 = ctx.obj['elbv2']
@@ -28,5 +34,6 @@ def top(ctx, cluster, service, group, exit_on_complete):
         click.echo('Error: Section "service-group" not in config file.')
         sys.exit(1)
 
-    utils.monitor_deployment(ecs, elbv2, cluster, service,
+    utils.monitor_deployment(ecs, elbv2, cluster, service, interval=interval,
+                             output=output,
                              exit_on_complete=exit_on_complete)
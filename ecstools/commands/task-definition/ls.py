@@ -1,8 +1,16 @@
 import click
 
+from concurrent.futures import ThreadPoolExecutor
+
+from ecstools.lib.paginate import paginate
 from ecstools.resources.task_definition import TaskDefinition
 
 
+# list_task_definitions returns at most 100 ARNs per page
+LIST_PAGE_SIZE = 100
+DESCRIBE_WORKERS = 8
+
+
 @click.command(short_help='List tasks definitions families / revisions')
 @click.argument('name', required=False)
 @click.option('-n', '--num', type=int, default=3, help='Number of results')
@@ -24,49 +32,61 @@ def ls(ctx, name, arn, num, no_details, repo):
         $ ecs def <task-definition-family>:<revision>
     """
     ecs = ctx.obj['ecs']
+    cache = ctx.obj['cache']
 
     if not name:
-        print_task_definition_families(ecs)
+        print_task_definition_families(ecs, cache)
     else:
-        print_task_definition_revisions(ecs, name, arn, num, no_details, repo)
+        print_task_definition_revisions(ecs, name, arn, num, no_details, repo,
+                                        cache)
 
 
-def print_task_definition_families(ecs):
-    res = ecs.list_task_definition_families()
-    for family in sorted(res['families']):
+def print_task_definition_families(ecs, cache):
+    families = cache.iterate('task-definition-families', 'all', lambda:
+                             paginate(ecs.list_task_definition_families,
+                                      'families'))
+    for family in sorted(families):
         click.echo(family)
 
 
-def print_task_definition_revisions(ecs, name, arn, num, no_details, repo):
+def print_task_definition_revisions(ecs, name, arn, num, no_details, repo,
+                                    cache):
     # Task definition revision was specified
     if ':' in name:
         definitions = [name]
     else:
-        res = ecs.list_task_definitions(
-            familyPrefix=name,
-            sort='DESC',
-            maxResults=num
-        )
-        definitions = res['taskDefinitionArns']
-
-    if not arn:
-        definitions = map(lambda x: x.split('/')[-1], definitions)
-
-    print_task_definition_info(ecs, repo, definitions, no_details)
-
-
-def print_task_definition_info(ecs, repo, definitions, no_details):
-    for td_name in sorted(definitions):
-        if no_details:
-            click.echo(td_name)
-            continue
-
-        td = TaskDefinition(ecs, td_name)
-        click.secho('%s cpu: %s memory: %s' % (td.revision(),
-                                               td.cpu(),
-                                               td.memory()
-                                               ), fg='blue')
-        print_containers_info(repo, td.containers())
+        definitions = cache.get_or_fetch(
+            'task-definition-revisions', '%s/%s' % (name, num),
+            lambda: list(paginate(
+                ecs.list_task_definitions,
+                'taskDefinitionArns',
+                limit=num,
+                familyPrefix=name,
+                sort='DESC',
+                maxResults=min(num, LIST_PAGE_SIZE)
+            )))
+
+    print_task_definition_info(ecs, repo, definitions, no_details, arn)
+
+
+def print_task_definition_info(ecs, repo, definitions, no_details, arn):
+    definitions = sorted(definitions)
+    if no_details:
+        for td_arn in definitions:
+            click.echo(td_arn if arn else td_arn.split('/')[-1])
+        return
+
+    # Revisions are described concurrently and printed in order as soon
+    # as they arrive. Look them up by ARN so revisions cached on disk are
+    # found offline.
+    workers = max(min(DESCRIBE_WORKERS, len(definitions)), 1)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for td in pool.map(lambda x: TaskDefinition(ecs, x), definitions):
+            click.secho('%s cpu: %s memory: %s' % (td.revision(),
+                                                   td.cpu(),
+                                                   td.memory()
+                                                   ), fg='blue')
+            print_containers_info(repo, td.containers())
 
 
 def print_containers_info(repo, containers):
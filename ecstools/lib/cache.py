@@ -0,0 +1,457 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import datetime
+import threading
+from collections import OrderedDict
+
+from dateutil.tz import tzlocal
+
+from ecstools.lib.config import config
+
+
+cache_dir = os.path.expanduser('~/.cache/ecstools')
+# Documents kept per on-disk store
+DISK_MAXSIZE = 10000
+# Share of the documents kept when a full on-disk store evicts
+DISK_EVICT_TO = 0.9
+
+
+def _json_default(value):
+    if isinstance(value, datetime.datetime):
+        return {'__datetime__': value.timestamp()}
+    raise TypeError('Object of type %s is not JSON serializable' %
+                    type(value).__name__)
+
+
+def _json_object_hook(obj):
+    if '__datetime__' in obj:
+        return datetime.datetime.fromtimestamp(obj['__datetime__'],
+                                               tz=tzlocal())
+    return obj
+
+
+def dumps(value):
+    """Serialize AWS responses. Datetimes survive the round trip."""
+    return json.dumps(value, default=_json_default)
+
+
+def loads(value):
+    return json.loads(value, object_hook=_json_object_hook)
+
+
+class LRUCache(object):
+    """Thread-safe in-memory cache holding at most `maxsize` items"""
+
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._items:
+                return None
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+class DiskStore(object):
+    """
+    Stores one JSON document per key in a directory. With `maxsize` the
+    oldest documents are removed once there are more, down to
+    DISK_EVICT_TO of it. The documents are counted once and then tracked
+    in memory, so the directory is only listed again to evict.
+    """
+
+    def __init__(self, path, maxsize=None):
+        self.path = path
+        self.maxsize = maxsize
+        self._count = None
+        self._lock = threading.Lock()
+
+    def _filename(self, key):
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.path, digest + '.json')
+
+    def has(self, key):
+        return os.path.exists(self._filename(key))
+
+    def get(self, key):
+        try:
+            with open(self._filename(key)) as f:
+                return loads(f.read())
+        except (IOError, OSError, ValueError):
+            return None
+
+    def set(self, key, value):
+        fn = self._filename(key)
+        tmp = '%s.%s.tmp' % (fn, threading.get_ident())
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            with open(tmp, 'w') as f:
+                f.write(dumps(value))
+            os.replace(tmp, fn)
+        except (IOError, OSError):
+            return
+        if self.maxsize is not None:
+            self._added()
+
+    def _added(self):
+        with self._lock:
+            if self._count is None:
+                self._count = len(self._documents())
+            else:
+                # Overwrites are counted too, eviction recounts
+                self._count += 1
+            if self._count > self.maxsize:
+                self._count = self._evict()
+
+    def _documents(self):
+        try:
+            return [e for e in os.scandir(self.path)
+                    if e.name.endswith('.json')]
+        except (IOError, OSError):
+            return []
+
+    def _evict(self):
+        """Removes the oldest documents. Returns the number left."""
+        entries = self._documents()
+        if len(entries) <= self.maxsize:
+            return len(entries)
+        keep = int(self.maxsize * DISK_EVICT_TO)
+        try:
+            entries.sort(key=lambda e: e.stat().st_mtime)
+            for entry in entries[:len(entries) - keep]:
+                os.remove(entry.path)
+        except (IOError, OSError):
+            pass
+        return keep
+
+
+def is_qualified_task_definition(name):
+    """
+    Returns True for task definition ARNs and family:revision names.
+    Those always point to the same immutable revision.
+    """
+    return name.startswith('arn:') or ':' in name
+
+
+class TaskDefinitionCache(object):
+    """
+    Process-wide cache of task definition revisions.
+    Registered revisions never change so entries never expire. Only
+    fully-qualified names are looked up; a bare family name resolves to
+    the latest revision and always goes to the API.
+    Revisions are also written to and read back from the `disk` store
+    when one is configured.
+    """
+
+    def __init__(self, maxsize=512, disk=None):
+        self.memory = LRUCache(maxsize)
+        self.disk = disk
+
+    @staticmethod
+    def _key(ecs, name):
+        return (ecs.meta.region_name, name)
+
+    def get(self, ecs, name):
+        if not is_qualified_task_definition(name):
+            return None
+
+        td = self.memory.get(self._key(ecs, name))
+        if td is None and self.disk is not None and \
+                name.startswith('arn:'):
+            td = self.disk.get(name)
+            if td is not None:
+                self.set(ecs, td)
+        return td
+
+    def set(self, ecs, td):
+        arn = td['taskDefinitionArn']
+        revision = '%s:%s' % (td['family'], td['revision'])
+        self.memory.set(self._key(ecs, arn), td)
+        self.memory.set(self._key(ecs, revision), td)
+        if self.disk is not None and not self.disk.has(arn):
+            self.disk.set(arn, td)
+
+
+task_definitions = TaskDefinitionCache()
+
+
+class TaskDefinitionIndex(object):
+    """
+    Index of task definition content hashes to the ARNs of revisions with
+    that content, so deploys can reuse a revision instead of registering
+    a duplicate. Revisions registered in this run are trusted. Entries
+    read back from the `disk` store may have been deregistered since.
+    Keys are namespaced by profile, since the same content can be
+    registered in several accounts.
+    """
+
+    def __init__(self, disk=None, namespace='default'):
+        self.memory = {}
+        self.disk = disk
+        self.namespace = namespace
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _key(self, ecs, digest):
+        return '/'.join([self.namespace, ecs.meta.region_name, digest])
+
+    def get(self, ecs, digest):
+        """Returns the ARN of a revision registered in this run"""
+        with self._lock:
+            return self.memory.get(self._key(ecs, digest))
+
+    def get_stored(self, ecs, digest):
+        """Returns the ARN stored on disk. Check it is still active."""
+        if self.disk is None:
+            return None
+        return self.disk.get(self._key(ecs, digest))
+
+    def set(self, ecs, digest, arn):
+        """Index a revision registered in this run"""
+        with self._lock:
+            self.memory[self._key(ecs, digest)] = arn
+        self.store(ecs, digest, arn)
+
+    def store(self, ecs, digest, arn):
+        """Index a revision on disk only"""
+        if self.disk is not None:
+            self.disk.set(self._key(ecs, digest), arn)
+
+    def lock(self, ecs, digest):
+        """Returns the lock serializing registrations of the same content"""
+        with self._lock:
+            return self._locks.setdefault(self._key(ecs, digest),
+                                          threading.Lock())
+
+
+task_definition_index = TaskDefinitionIndex()
+
+
+class ImageDigestCache(object):
+    """
+    Process-wide index of ECR image tags to digests.
+    Tags can be moved to other images, so entries are only kept for the
+    run. With a `metadata` cache they are also stored there and served
+    for the image-digests TTL.
+    """
+
+    def __init__(self, metadata=None):
+        self.memory = {}
+        self.metadata = metadata
+        self._lock = threading.Lock()
+
+    def get(self, ecr, repository, tag):
+        key = (ecr.meta.region_name, repository, tag)
+        with self._lock:
+            digest = self.memory.get(key)
+        if digest is None and self.metadata is not None:
+            digest = self.metadata.get('image-digests',
+                                       '%s:%s' % (repository, tag))
+            if digest is not None:
+                with self._lock:
+                    self.memory[key] = digest
+        return digest
+
+    def set(self, ecr, repository, tag, digest):
+        with self._lock:
+            self.memory[(ecr.meta.region_name, repository, tag)] = digest
+        if self.metadata is not None:
+            self.metadata.set('image-digests', '%s:%s' % (repository, tag),
+                              digest)
+
+
+image_digests = ImageDigestCache()
+
+
+class TaskDefinitionTagCache(object):
+    """
+    Process-wide cache of the tags of task definition revisions.
+    Unlike the revisions, tags can be changed, so they are kept apart and
+    only for the run. With a `metadata` cache they are also stored there
+    and served for the task-definition-tags TTL.
+    """
+
+    def __init__(self, metadata=None):
+        self.memory = {}
+        self.metadata = metadata
+        self._lock = threading.Lock()
+
+    def get(self, ecs, arn):
+        key = (ecs.meta.region_name, arn)
+        with self._lock:
+            tags = self.memory.get(key)
+        if tags is None and self.metadata is not None:
+            tags = self.metadata.get('task-definition-tags', arn)
+            if tags is not None:
+                with self._lock:
+                    self.memory[key] = tags
+        return tags
+
+    def set(self, ecs, arn, tags):
+        with self._lock:
+            self.memory[(ecs.meta.region_name, arn)] = tags
+        if self.metadata is not None:
+            self.metadata.set('task-definition-tags', arn, tags)
+
+
+task_definition_tags = TaskDefinitionTagCache()
+
+
+# Seconds cached responses are served for, per resource type. Set
+# <resource>-ttl in the [cache] config section to override. Inventories
+# change rarely; what monitors and deploys act on is not cached.
+DEFAULT_TTLS = {
+    'clusters': 3600,
+    'image-digests': 0,
+    'services': 300,
+    'service-descriptions': 0,
+    'target-health': 0,
+    'task-definition-families': 3600,
+    'task-definition-revisions': 60,
+    'task-definition-tags': 0,
+}
+
+
+class MetadataCache(object):
+    """
+    Caches read API responses in SQLite. Responses are stored and served
+    while younger than the TTL of their resource type. Resource types
+    with a TTL of 0 are not stored.
+    With `refresh` cached responses are never served. With `offline` they
+    are served regardless of their age.
+    """
+
+    def __init__(self, path, namespace, ttls=None, refresh=False,
+                 offline=False):
+        self.path = path
+        self.namespace = namespace
+        self.ttls = ttls or DEFAULT_TTLS
+        self.refresh = refresh
+        self.offline = offline
+        self._db = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute('PRAGMA synchronous = OFF')
+            self._db.execute('CREATE TABLE IF NOT EXISTS cache ('
+                             'key TEXT PRIMARY KEY, '
+                             'value TEXT NOT NULL, '
+                             'fetched_at REAL NOT NULL)')
+        return self._db
+
+    def _key(self, resource, key):
+        return '/'.join([self.namespace, resource, key])
+
+    def get(self, resource, key):
+        """Returns the cached response or None if missing or expired"""
+        if self.refresh:
+            return None
+        ttl = self.ttls.get(resource, 0)
+        if not self.offline and ttl <= 0:
+            return None
+
+        try:
+            with self._lock:
+                row = self._connect().execute(
+                    'SELECT value, fetched_at FROM cache WHERE key = ?',
+                    (self._key(resource, key),)).fetchone()
+        except (sqlite3.Error, OSError):
+            return None
+
+        if row is None:
+            return None
+        value, fetched_at = row
+        if not self.offline and time.time() - fetched_at > ttl:
+            return None
+        return loads(value)
+
+    def set(self, resource, key, value):
+        if not self.offline and self.ttls.get(resource, 0) <= 0:
+            return
+        try:
+            with self._lock:
+                db = self._connect()
+                db.execute('INSERT OR REPLACE INTO cache VALUES (?, ?, ?)',
+                           (self._key(resource, key), dumps(value),
+                            time.time()))
+                db.commit()
+        except (sqlite3.Error, OSError):
+            pass
+
+    def get_or_fetch(self, resource, key, fetch):
+        value = self.get(resource, key)
+        if value is None:
+            value = fetch()
+            self.set(resource, key, value)
+        return value
+
+    def iterate(self, resource, key, fetch):
+        """
+        Like get_or_fetch for generators. Items are yielded as they are
+        fetched and the whole list is cached once exhausted.
+        """
+        value = self.get(resource, key)
+        if value is not None:
+            for item in value:
+                yield item
+            return
+
+        value = []
+        for item in fetch():
+            value.append(item)
+            yield item
+        self.set(resource, key, value)
+
+
+def configured_ttls():
+    ttls = dict(DEFAULT_TTLS)
+    for resource in ttls:
+        ttls[resource] = config.getint('cache', resource + '-ttl',
+                                       fallback=ttls[resource])
+    return ttls
+
+
+def configure(profile, region, refresh=False, offline=False):
+    """
+    Set up the on-disk caches under `cache_dir` for a cli run.
+    Returns the MetadataCache for the profile and region.
+    """
+    task_definitions.disk = None
+    if offline or config.getboolean('cache', 'task-definitions-on-disk',
+                                    fallback=False):
+        task_definitions.disk = DiskStore(
+            os.path.join(cache_dir, 'task-definitions'),
+            maxsize=config.getint('cache', 'task-definitions-on-disk-max',
+                                  fallback=DISK_MAXSIZE))
+    task_definition_index.disk = DiskStore(
+        os.path.join(cache_dir, 'task-definition-index'),
+        maxsize=DISK_MAXSIZE)
+    task_definition_index.namespace = profile or 'default'
+
+    metadata = MetadataCache(os.path.join(cache_dir, 'metadata.db'),
+                             '%s/%s' % (profile or 'default', region),
+                             ttls=configured_ttls(), refresh=refresh,
+                             offline=offline)
+    image_digests.metadata = metadata
+    task_definition_tags.metadata = metadata
+    return metadata
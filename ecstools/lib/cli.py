@@ -1,19 +1,22 @@
-import os
 import sys
 import click
 import string
+import pkgutil
+import importlib
 
 from ecstools.lib.config import config
 
 
 class AliasedGroup(click.Group):
 
-    @staticmethod
-    def _remove_options_parameters(args):
+    def _remove_options_parameters(self, ctx, args):
         """
         Removes options parameters.
         Returns a list of argument parameters only.
         """
+        flags = set(opt for param in self.get_params(ctx)
+                    if getattr(param, 'is_flag', False)
+                    for opt in param.opts + param.secondary_opts)
         tmp_args = args[:]
         for arg in tmp_args:
             if arg.startswith('-'):
@@ -21,14 +24,15 @@ class AliasedGroup(click.Group):
                 try:
                     # remove flag and its value
                     tmp_args.pop(index)
-                    tmp_args.pop(index)
+                    if arg not in flags:
+                        tmp_args.pop(index)
                 except IndexError:
                     pass
                 continue
         return tmp_args
 
     def parse_args(self, ctx, args):
-        tmp_args = self._remove_options_parameters(args)
+        tmp_args = self._remove_options_parameters(ctx, args)
 
         for arg in tmp_args[:1]:
             try:
@@ -41,6 +45,10 @@ class AliasedGroup(click.Group):
             except KeyError:
                 pass
         super(click.Group, self).parse_args(ctx, args)
+        # Subcommands print their help before the group callback is needed
+        ctx.meta['help_requested'] = any(
+            name in ctx.protected_args + ctx.args
+            for name in ctx.help_option_names)
 
     def get_command(self, ctx, cmd_name):
         """
@@ -61,24 +69,72 @@ class AliasedGroup(click.Group):
 
 
 class Subcommand(click.MultiCommand):
-    plugin_folder = os.path.dirname(os.path.realpath(__file__))
+    """
+    Loads subcommands from the modules of `plugin_package`. A module named
+    NAME provides the command NAME. Other packages can add commands through
+    the `entry_point_group` entry points.
+    Modules are imported once per process and cached like any other import.
+    """
+    plugin_package = 'ecstools.commands'
+    entry_point_group = None
+
+    _registries = {}
+    _commands = {}
+
+    def _plugin_commands(self):
+        """Returns a dict of command names to module names"""
+        key = ('plugins', self.plugin_package)
+        if key not in self._registries:
+            package = importlib.import_module(self.plugin_package)
+            alpha = tuple(string.ascii_letters)
+            self._registries[key] = dict(
+                (name, '%s.%s' % (self.plugin_package, name))
+                for _, name, ispkg in pkgutil.iter_modules(package.__path__)
+                if name.startswith(alpha) and not ispkg
+            )
+        return self._registries[key]
+
+    def _entry_point_commands(self):
+        """Returns a dict of command names to entry points"""
+        if self.entry_point_group is None:
+            return {}
+        # Groups may share their name with the plugin package
+        key = ('entry_points', self.entry_point_group)
+        if key not in self._registries:
+            self._registries[key] = dict(
+                (ep.name, ep) for ep in entry_points(self.entry_point_group))
+        return self._registries[key]
 
     def list_commands(self, ctx):
-        rv = []
-        alpha = string.ascii_letters
-        for filename in os.listdir(self.plugin_folder):
-            if filename.startswith(tuple(alpha)) and filename.endswith('.py'):
-                rv.append(filename[:-3])
-        rv.sort()
-        return rv
+        rv = set(self._plugin_commands())
+        rv.update(self._entry_point_commands())
+        return sorted(rv)
 
     def get_command(self, ctx, name):
-        ns = {}
-        fn = os.path.join(self.plugin_folder, name + '.py')
-        if not os.path.isfile(fn):
+        key = (self.plugin_package, name)
+        if key in self._commands:
+            return self._commands[key]
+
+        if name in self._plugin_commands():
+            module = importlib.import_module(self._plugin_commands()[name])
+            command = getattr(module, name)
+        elif name in self._entry_point_commands():
+            command = self._entry_point_commands()[name].load()
+        else:
             click.echo('Command not found: %s' % name)
             sys.exit(0)
-        with open(fn) as f:
-            code = compile(f.read(), fn, 'exec')
-            eval(code, ns, ns)
-        return ns[name]
+
+        self._commands[key] = command
+        return command
+
+
+def entry_points(group):
+    """Returns the installed entry points of a group"""
+    try:
+        from importlib import metadata
+    except ImportError:
+        return []
+    eps = metadata.entry_points()
+    if hasattr(eps, 'select'):
+        return list(eps.select(group=group))
+    return list(eps.get(group, []))
@@ -0,0 +1,66 @@
+import sys
+import click
+import threading
+
+
+class Clients(dict):
+    """
+    The ctx.obj dict. AWS clients are created on first access so commands
+    only pay for the clients they use. Their calls are paced by the
+    RequestScheduler `scheduler` and recorded by the `tracers`.
+    In `offline` mode the clients refuse to make any API call.
+    """
+    services = ('ecs', 'ecr', 'elbv2')
+
+    def __init__(self, session, scheduler=None, tracers=(), offline=False,
+                 **kwargs):
+        super(Clients, self).__init__(**kwargs)
+        self.session = session
+        self.scheduler = scheduler
+        self.tracers = tracers
+        self.offline = offline
+        self._lock = threading.Lock()
+
+    def __missing__(self, key):
+        if key not in self.services:
+            raise KeyError(key)
+        # boto3 sessions are not thread-safe
+        with self._lock:
+            if not dict.__contains__(self, key):
+                self[key] = self._client(key)
+            return dict.__getitem__(self, key)
+
+    def _client(self, service):
+        if self.offline:
+            return OfflineClient(service, self.session.region_name)
+        if self.scheduler is None:
+            client = self.session.client(service)
+        else:
+            client = self.session.client(
+                service, config=self.scheduler.client_config())
+            self.scheduler.register(client, service)
+        # Registered last so that scheduler waits are not timed
+        for tracer in self.tracers:
+            tracer.register(client, service)
+        return client
+
+
+class ClientMeta(object):
+    def __init__(self, region_name):
+        self.region_name = region_name
+
+
+class OfflineClient(object):
+    """Stands in for a client when only cached responses may be used"""
+
+    def __init__(self, service, region_name):
+        self.service = service
+        self.meta = ClientMeta(region_name)
+
+    def __getattr__(self, operation):
+        def offline(*args, **kwargs):
+            click.echo('Error: %s %s is not in the local cache. Run the '
+                       'command without --offline first.' %
+                       (self.service, operation), err=True)
+            sys.exit(1)
+        return offline
@@ -0,0 +1,164 @@
+import sys
+import json
+import click
+
+
+DEFAULT_MAX_PARALLEL = 4
+
+# Seconds a wave may take to complete before the rollout fails
+DEFAULT_WAVE_TIMEOUT = 1800
+
+
+class Target(object):
+    """A service to deploy as part of a fleet deployment"""
+
+    def __init__(self, cluster, service, tags, after):
+        self.cluster = cluster
+        self.service = service
+        self.tags = tags
+        self.after = after
+
+    def name(self):
+        return '%s/%s' % (self.cluster, self.service)
+
+
+class Manifest(object):
+    """
+    A fleet deployment read from a YAML or JSON file:
+
+        tags: [v1.2.3]
+        max-parallel: 4
+        wave-timeout: 1800
+        cluster-max-parallel:
+          production: 2
+        targets:
+          - cluster: staging
+            services: [app1, app2]
+          - cluster: production
+            services: [app1, app2]
+            after: [staging]
+
+    Targets deploy the manifest `tags` unless they set their own. `after`
+    lists clusters or cluster/service names which have to be deployed
+    first. `max-parallel` caps the deployments in flight per cluster.
+    The rollout fails when a wave does not complete within `wave-timeout`
+    seconds.
+    """
+
+    def __init__(self, document):
+        if not isinstance(document, dict) or \
+                not isinstance(document.get('targets'), list):
+            fail('The manifest needs a list of targets.')
+
+        self.max_parallel = positive_int(
+            document.get('max-parallel', DEFAULT_MAX_PARALLEL),
+            'max-parallel')
+        self.wave_timeout = positive_int(
+            document.get('wave-timeout', DEFAULT_WAVE_TIMEOUT), 'wave-timeout')
+        cluster_max_parallel = document.get('cluster-max-parallel', {})
+        if not isinstance(cluster_max_parallel, dict):
+            fail('cluster-max-parallel needs a limit per cluster.')
+        self.cluster_max_parallel = dict(
+            (cluster, positive_int(limit, 'cluster-max-parallel of %s' %
+                                   cluster))
+            for cluster, limit in cluster_max_parallel.items())
+        self.targets = []
+        for entry in document['targets']:
+            self.targets.extend(self._targets(entry, document.get('tags')))
+
+        names = [t.name() for t in self.targets]
+        duplicates = sorted(set(n for n in names if names.count(n) > 1))
+        if duplicates:
+            fail('Services listed more than once: %s' %
+                 ', '.join(duplicates))
+
+    @staticmethod
+    def _targets(entry, tags):
+        if not isinstance(entry, dict) or 'cluster' not in entry:
+            fail('Every target needs a cluster: %s' % entry)
+
+        services = entry.get('services', [])
+        if 'service' in entry:
+            services = [entry['service']] + services
+        if not services:
+            fail('Target without services: %s' % entry)
+
+        tags = entry.get('tags', tags)
+        if isinstance(tags, str):
+            tags = tags.split(' ')
+        if not tags:
+            fail('No tags to deploy to %s.' % entry['cluster'])
+
+        return [Target(entry['cluster'], service, list(tags),
+                       entry.get('after', []))
+                for service in services]
+
+    def cluster_limit(self, cluster):
+        return self.cluster_max_parallel.get(cluster, self.max_parallel)
+
+    def waves(self):
+        """
+        Group the targets into waves. A target is in the first wave after
+        all the targets it has to wait for.
+        """
+        dependencies = {}
+        for target in self.targets:
+            dependencies[target.name()] = set()
+            for name in target.after:
+                matches = [t.name() for t in self.targets
+                           if name in (t.cluster, t.name())]
+                if not matches:
+                    fail('%s waits for unknown target %s.' %
+                         (target.name(), name))
+                dependencies[target.name()].update(matches)
+
+        waves = []
+        deployed = set()
+        remaining = list(self.targets)
+        while remaining:
+            wave = [t for t in remaining
+                    if dependencies[t.name()] <= deployed]
+            if not wave:
+                fail('Circular dependency between %s.' %
+                     ', '.join(t.name() for t in remaining))
+            waves.append(wave)
+            deployed.update(t.name() for t in wave)
+            remaining = [t for t in remaining if t not in wave]
+        return waves
+
+
+def load_manifest(path):
+    """Read a Manifest. YAML manifests need PyYAML."""
+    try:
+        with open(path) as f:
+            content = f.read()
+    except (IOError, OSError) as e:
+        fail('Cannot read manifest: %s' % e)
+
+    if path.endswith('.json'):
+        try:
+            return Manifest(json.loads(content))
+        except ValueError as e:
+            fail('Invalid manifest: %s' % e)
+
+    try:
+        import yaml
+    except ImportError:
+        fail('YAML manifests need PyYAML: pip install ecstools[yaml]. '
+             'JSON manifests work without it.')
+    try:
+        return Manifest(yaml.safe_load(content))
+    except yaml.YAMLError as e:
+        fail('Invalid manifest: %s' % e)
+
+
+def positive_int(value, name):
+    # bool is an int too
+    if not isinstance(value, int) or isinstance(value, bool) or value < 1:
+        fail('%s has to be a positive number, not %r.' % (name, value))
+    return value
+
+
+def fail(message):
+    click.echo('Error: %s' % message, err=True)
+    sys.exit(1)
@@ -0,0 +1,17 @@
+def paginate(method, key, limit=None, token='nextToken', **params):
+    """
+    Call a list API until the last page and yield the items under `key`
+    page by page. Stops after `limit` items.
+    """
+    count = 0
+    while True:
+        response = method(**params)
+        for item in response[key]:
+            if limit is not None and count >= limit:
+                return
+            yield item
+            count += 1
+
+        if not response.get(token):
+            return
+        params[token] = response[token]
@@ -0,0 +1,166 @@
+import random
+from collections import deque
+
+from ecstools.lib.trace import traced
+from ecstools.resources.service import Service, describe_services
+
+
+# Events kept per service by EventTail
+EVENT_BUFFER_SIZE = 50
+
+# describe_services returns at most the last 100 events of a service
+DESCRIBED_EVENTS = 100
+
+
+class ServicePoller(object):
+    """
+    Fetches snapshots of a fixed set of services with as few
+    describe_services calls as possible.
+    """
+
+    def __init__(self, ecs, cluster, services):
+        self.ecs = ecs
+        self.cluster = cluster
+        self.services = services
+
+    @traced
+    def poll(self):
+        """Returns a list of Service snapshots in the monitored order"""
+        descriptions = describe_services(self.ecs, self.cluster,
+                                         self.services)
+        return [Service(self.ecs, None, self.cluster, name,
+                        description=descriptions[name])
+                for name in self.services]
+
+
+class FleetPoller(object):
+    """
+    ServicePoller for services across clusters. `targets` is a list of
+    (cluster, service) pairs. Services are described in batches per
+    cluster.
+    """
+
+    def __init__(self, ecs, targets):
+        self.targets = targets
+        clusters = []
+        for cluster, _ in targets:
+            if cluster not in clusters:
+                clusters.append(cluster)
+        self.pollers = [ServicePoller(ecs, cluster,
+                                      [s for c, s in targets if c == cluster])
+                        for cluster in clusters]
+
+    @traced
+    def poll(self):
+        """Returns a list of Service snapshots in the order of targets"""
+        snapshots = {}
+        for poller in self.pollers:
+            for srv in poller.poll():
+                snapshots[(poller.cluster, srv.name())] = srv
+        return [snapshots[target] for target in self.targets]
+
+
+class EventTail(object):
+    """
+    Follows the events of services across polls. Only the last `size`
+    events per service are kept, so memory stays constant however long
+    the tail runs. `backlog` events are returned for a service the first
+    time it is seen.
+    """
+
+    def __init__(self, size=EVENT_BUFFER_SIZE, backlog=1):
+        self.size = size
+        self.backlog = backlog
+        self._events = {}
+        self._last_ids = {}
+
+    def update(self, srv):
+        """
+        Returns the events of a Service snapshot which were not seen
+        before, oldest first.
+        """
+        key = srv.arn()
+        events = new_events(srv.events(DESCRIBED_EVENTS),
+                            self._last_ids.get(key), self.backlog)
+        if events:
+            self._last_ids[key] = events[0]['id']
+        events.reverse()
+        self._events.setdefault(key, deque(maxlen=self.size)).extend(events)
+        return events
+
+    def recent(self, srv, number):
+        """Returns the last `number` events of a service, oldest first"""
+        events = self._events.get(srv.arn(), ())
+        return list(events)[max(len(events) - number, 0):]
+
+
+def new_events(events, last_event_id, backlog=1):
+    """
+    Returns the events newer than `last_event_id`, newest first.
+    Only the latest `backlog` events are new when nothing has been seen
+    yet.
+    """
+    if last_event_id is None:
+        return events[:backlog]
+    for i, e in enumerate(events):
+        if e['id'] == last_event_id:
+            return events[:i]
+    return events
+
+
+def snapshot_state(services):
+    """
+    Returns the parts of the service snapshots which change while
+    deployments are moving. Used to detect idle polls.
+    """
+    state = []
+    for srv in services:
+        events = srv.events(1)
+        state.append((
+            srv.name(),
+            srv.running_count(),
+            srv.desired_count(),
+            srv.pending_count(),
+            tuple((d['id'], d['runningCount'], d['desiredCount'],
+                   d['pendingCount']) for d in srv.deployments()),
+            events[0]['id'] if events else None,
+        ))
+    return state
+
+
+class PollInterval(object):
+    """
+    Polls every `interval` seconds while something changes between polls.
+    Once nothing has changed for `idle_polls` polls the delay doubles on
+    every poll, with jitter, up to `max_interval`. Throttling doubles the
+    delay right away.
+    """
+
+    def __init__(self, interval=1, max_interval=30, idle_polls=5):
+        self.interval = interval
+        self.max_interval = max(interval, max_interval)
+        self.idle_polls = idle_polls
+        self._idle = 0
+        self._delay = interval
+
+    def next(self, changed):
+        """Returns the number of seconds to wait before the next poll"""
+        if changed:
+            self._idle = 0
+            self._delay = self.interval
+            return self._delay
+
+        self._idle += 1
+        if self._idle >= self.idle_polls:
+            self._delay = min(self._delay * 2, self.max_interval)
+        return self._jitter(self._delay)
+
+    def throttled(self):
+        """Returns the number of seconds to wait after a throttling error"""
+        self._delay = min(self._delay * 2, self.max_interval)
+        return self._jitter(self._delay)
+
+    def _jitter(self, delay):
+        if delay <= self.interval:
+            return delay
+        return random.uniform(max(self.interval, delay / 2), delay)
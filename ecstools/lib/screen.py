@@ -0,0 +1,157 @@
+import time
+import curses
+
+from ecstools.lib.trace import traced
+
+
+SCROLL_KEYS = {
+    curses.KEY_UP: -1,
+    ord('k'): -1,
+    curses.KEY_DOWN: 1,
+    ord('j'): 1,
+}
+
+PAGE_KEYS = {
+    curses.KEY_PPAGE: -1,
+    ord('b'): -1,
+    curses.KEY_NPAGE: 1,
+    ord(' '): 1,
+}
+
+QUIT_KEYS = (ord('q'), ord('Q'))
+
+ENTER_KEYS = (curses.KEY_ENTER, 10, 13)
+
+BACK_KEYS = (27, curses.KEY_BACKSPACE, curses.KEY_LEFT, 8, 127, ord('h'))
+
+
+class Frame(object):
+    """
+    Collects the lines of one screen update. Implements the subset of the
+    curses window API the print functions use, so they can draw into a
+    frame instead of the terminal.
+    """
+
+    def __init__(self, cols):
+        self.cols = cols
+        self.lines = []
+
+    def addstr(self, y, x, text, attr=curses.A_NORMAL):
+        # A newline continues the text at the start of the next line
+        for i, part in enumerate(text.split('\n')):
+            self._add(y + i, x if i == 0 else 0, part, attr)
+
+    def _add(self, y, x, text, attr):
+        while len(self.lines) <= y:
+            self.lines.append([])
+        if text and x >= 0:
+            self.lines[y].append((x, text, attr))
+
+
+class Screen(object):
+    """
+    Draws frames on a curses window. Only the lines which differ from the
+    previously drawn frame are rewritten. Frames taller than the terminal
+    scroll below the first `pinned` lines.
+    """
+
+    def __init__(self, scr, pinned=0):
+        self.scr = scr
+        self.pinned = pinned
+        self.offset = 0
+        self.frame = Frame(0)
+        self._rows = []
+        scr.keypad(True)
+
+    def cols(self):
+        return self.scr.getmaxyx()[1]
+
+    @traced
+    def render(self, frame=None):
+        if frame is not None:
+            self.frame = frame
+        height, width = self.scr.getmaxyx()
+        rows = self._viewport(height)
+        rows += [[]] * (height - len(rows))
+
+        for y, row in enumerate(rows):
+            if y < len(self._rows) and self._rows[y] == row:
+                continue
+            self._draw(y, row, width)
+        self._rows = rows
+        self.scr.refresh()
+
+    def _viewport(self, height):
+        pinned = self.frame.lines[:self.pinned]
+        body = self.frame.lines[self.pinned:]
+        space = height - len(pinned)
+        if len(body) <= space:
+            self.offset = 0
+            return pinned + body
+
+        # Keep the last line for the scroll position
+        space = max(space - 1, 1)
+        self.offset = max(0, min(self.offset, len(body) - space))
+        visible = body[self.offset:self.offset + space]
+        status = ' Lines %s-%s of %s  Up/Down/PgUp/PgDn to scroll ' % (
+            self.offset + 1, self.offset + len(visible), len(body))
+        return pinned + visible + [[(0, status, curses.A_REVERSE)]]
+
+    def _draw(self, y, row, width):
+        try:
+            self.scr.move(y, 0)
+            self.scr.clrtoeol()
+            for x, text, attr in row:
+                if x < width:
+                    self.scr.addnstr(y, x, text, width - x, attr)
+        except curses.error:
+            # Writing the bottom right cell moves the cursor off screen
+            pass
+
+    def page_size(self):
+        return max(self.scr.getmaxyx()[0] - self.pinned - 1, 1)
+
+    def show_line(self, line):
+        """Scroll the viewport so that body line `line` is visible"""
+        page = self.page_size()
+        if line < self.offset:
+            self.offset = line
+        elif line >= self.offset + page:
+            self.offset = line - page + 1
+
+    def wait(self, delay, keys=()):
+        """
+        Wait `delay` seconds before the next update. Keys pressed in the
+        meantime scroll the viewport, resizes redraw the whole screen.
+        Returns early with the key when one of `keys` is pressed.
+        """
+        deadline = time.time() + delay
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return None
+            self.scr.timeout(max(int(remaining * 1000), 1))
+            key = self.scr.getch()
+            if key in keys:
+                return key
+            if key != -1:
+                self.handle_key(key)
+
+    def handle_key(self, key):
+        if key in QUIT_KEYS:
+            raise KeyboardInterrupt()
+        elif key == curses.KEY_RESIZE:
+            curses.update_lines_cols()
+            self.scr.clear()
+            self._rows = []
+        elif key in SCROLL_KEYS:
+            self.offset += SCROLL_KEYS[key]
+        elif key in PAGE_KEYS:
+            self.offset += PAGE_KEYS[key] * self.page_size()
+        elif key in (curses.KEY_HOME, ord('g')):
+            self.offset = 0
+        elif key in (curses.KEY_END, ord('G')):
+            self.offset = len(self.frame.lines)
+        else:
+            return
+        self.render()
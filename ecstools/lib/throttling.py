@@ -0,0 +1,158 @@
+import time
+import click
+import threading
+from functools import partial
+from collections import Counter
+
+from ecstools.lib.config import config
+
+
+# Error codes AWS services return when a request is rate limited
+THROTTLING_ERROR_CODES = (
+    'Throttling',
+    'ThrottlingException',
+    'ThrottledException',
+    'RequestLimitExceeded',
+    'TooManyRequestsException',
+)
+
+# Sustained calls per second per operation. Bursts may be twice as high.
+# Set <service>-rate in the [throttling] config section to override.
+DEFAULT_RATES = {
+    'ecs': 20,
+    'ecr': 10,
+    'elbv2': 10,
+}
+
+# botocore's connection pool holds 10 connections per client
+DEFAULT_MAX_CONCURRENCY = 10
+
+DEFAULT_MAX_ATTEMPTS = 5
+
+
+def is_throttling_error(e):
+    """Returns True if a botocore ClientError is a throttling error"""
+    return e.response.get('Error', {}).get('Code') in THROTTLING_ERROR_CODES
+
+
+class TokenBucket(object):
+    """
+    Thread-safe token bucket allowing `rate` calls per second on average
+    and bursts of up to `burst` calls.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = burst or max(2 * self.rate, 1)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take a token. Returns the number of seconds it waited for it."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens +
+                               (now - self._updated) * self.rate)
+            self._updated = now
+            # Tokens are taken on credit, so waiting callers are served in
+            # the order they arrived
+            self._tokens -= 1
+            wait = max(-self._tokens / self.rate, 0)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class RequestScheduler(object):
+    """
+    Paces the API calls of the clients registered with it. Every operation
+    has a token bucket, and at most `max_concurrency` calls per service
+    are in flight. Counts calls and throttling errors per operation.
+    """
+
+    def __init__(self, rates=None, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                 max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.rates = rates or DEFAULT_RATES
+        self.max_concurrency = max_concurrency
+        self.max_attempts = max_attempts
+        self.calls = Counter()
+        self.throttled = Counter()
+        self._buckets = {}
+        self._slots = {}
+        self._lock = threading.Lock()
+
+    def register(self, client, service):
+        """Route the calls of a botocore client through the scheduler"""
+        events = client.meta.events
+        events.register('before-call', partial(self._before_call, service))
+        events.register('needs-retry', partial(self._needs_retry, service))
+        with self._lock:
+            slots = self._slots.setdefault(
+                service, threading.BoundedSemaphore(self.max_concurrency))
+
+        # A call holds its slot until it returns or raises, also when it
+        # fails before botocore emits after-call or after-call-error
+        make_api_call = client._make_api_call
+
+        def limited_api_call(operation_name, api_params):
+            with slots:
+                return make_api_call(operation_name, api_params)
+        client._make_api_call = limited_api_call
+
+    def _bucket(self, operation):
+        with self._lock:
+            if operation not in self._buckets:
+                rate = self.rates.get(operation[0], DEFAULT_RATES['ecs'])
+                self._buckets[operation] = TokenBucket(rate)
+            return self._buckets[operation]
+
+    def _before_call(self, service, event_name, **kwargs):
+        operation = (service, event_name.split('.')[-1])
+        self._bucket(operation).acquire()
+        with self._lock:
+            self.calls[operation] += 1
+
+    def _needs_retry(self, service, event_name, response=None, **kwargs):
+        # Only counts; the retry decision is left to botocore
+        if response is None:
+            return None
+        code = response[1].get('Error', {}).get('Code')
+        if code in THROTTLING_ERROR_CODES:
+            with self._lock:
+                self.throttled[(service, event_name.split('.')[-1])] += 1
+        return None
+
+    def client_config(self):
+        """Returns the botocore Config for clients using the scheduler"""
+        from botocore.config import Config
+        return Config(
+            retries={'mode': 'adaptive', 'max_attempts': self.max_attempts},
+            max_pool_connections=self.max_concurrency,
+        )
+
+
+def configure():
+    """Returns a RequestScheduler set up from the [throttling] section"""
+    rates = dict(DEFAULT_RATES)
+    for service in rates:
+        rates[service] = config.getfloat('throttling', service + '-rate',
+                                         fallback=rates[service])
+    return RequestScheduler(
+        rates=rates,
+        max_concurrency=config.getint('throttling', 'max-concurrency',
+                                      fallback=DEFAULT_MAX_CONCURRENCY),
+        max_attempts=config.getint('throttling', 'max-attempts',
+                                   fallback=DEFAULT_MAX_ATTEMPTS),
+    )
+
+
+def print_throttling_summary(scheduler):
+    """Tell how often AWS throttled the run, if it did"""
+    total = sum(scheduler.throttled.values())
+    if not total:
+        return
+    operations = ', '.join('%s %s %s' % (service, operation, count)
+                           for (service, operation), count in
+                           scheduler.throttled.most_common())
+    click.echo('Throttled %s times: %s' % (total, operations), err=True)
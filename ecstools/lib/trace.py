@@ -0,0 +1,272 @@
+import os
+import json
+import time
+import click
+import threading
+from functools import partial, wraps
+from collections import OrderedDict
+
+
+# The TraceRecorder of --trace-file. Spans are no-ops while it is None.
+_recorder = None
+
+
+class ApiCall(object):
+    """One traced API call"""
+
+    def __init__(self, service, operation, start, end, retries=0,
+                 size=0, error=None):
+        self.service = service
+        self.operation = operation
+        self.start = start
+        self.end = end
+        self.retries = retries
+        self.size = size
+        self.error = error
+
+    def latency(self):
+        return self.end - self.start
+
+
+class ApiTracer(object):
+    """
+    Records every call of the clients registered with it, with its latency,
+    retries and response size. Calls are timed from after the request
+    scheduler let them through until the response is parsed.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def register(self, client, service):
+        events = client.meta.events
+        events.register('before-call', self._before_call)
+        events.register('after-call', partial(self._after_call, service))
+        events.register('after-call-error',
+                        partial(self._after_call_error, service))
+
+    def _before_call(self, context, **kwargs):
+        context['trace_start'] = time.monotonic()
+
+    def _after_call(self, service, event_name, context, http_response=None,
+                    parsed=None, **kwargs):
+        start = context.pop('trace_start', None)
+        if start is None:
+            return
+        parsed = parsed or {}
+        self._record(ApiCall(
+            service, event_name.split('.')[-1], start, time.monotonic(),
+            retries=parsed.get('ResponseMetadata', {}).get('RetryAttempts',
+                                                           0),
+            size=len(http_response.content) if http_response else 0,
+            error=parsed.get('Error', {}).get('Code')))
+
+    def _after_call_error(self, service, event_name, context, exception,
+                          **kwargs):
+        start = context.pop('trace_start', None)
+        if start is None:
+            return
+        self._record(ApiCall(service, event_name.split('.')[-1], start,
+                             time.monotonic(),
+                             error=type(exception).__name__))
+
+    def _record(self, call):
+        with self._lock:
+            self.calls.append(call)
+
+    def operations(self):
+        """Returns the calls grouped by (service, operation)"""
+        with self._lock:
+            calls = list(self.calls)
+        operations = OrderedDict()
+        for call in sorted(calls, key=lambda c: (c.service, c.operation)):
+            operations.setdefault((call.service, call.operation),
+                                  []).append(call)
+        return operations
+
+    def network_time(self):
+        """
+        Returns the seconds at least one call was in flight. Concurrent
+        calls are only counted once.
+        """
+        with self._lock:
+            intervals = sorted((c.start, c.end) for c in self.calls)
+        total = 0
+        current_start = current_end = None
+        for start, end in intervals:
+            if current_end is None or start > current_end:
+                if current_end is not None:
+                    total += current_end - current_start
+                current_start, current_end = start, end
+            else:
+                current_end = max(current_end, end)
+        if current_end is not None:
+            total += current_end - current_start
+        return total
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of a non-empty list"""
+    values = sorted(values)
+    rank = max(int(round(percent / 100.0 * len(values))), 1)
+    return values[rank - 1]
+
+
+def format_size(size):
+    if size < 1024:
+        return '%sB' % size
+    for unit in ('KB', 'MB'):
+        size /= 1024.0
+        if size < 1024:
+            return '%.1f%s' % (size, unit)
+    return '%.1fGB' % (size / 1024.0)
+
+
+def print_trace_summary(tracer):
+    """Print calls, retries, errors and latencies per operation"""
+    row = '{:45} {:>6} {:>7} {:>6} {:>8} {:>8} {:>8} {:>9}'
+    click.echo('', err=True)
+    click.echo(row.format('OPERATION', 'CALLS', 'RETRIES', 'ERRORS', 'P50',
+                          'P95', 'TOTAL', 'RECEIVED'), err=True)
+
+    for (service, operation), calls in tracer.operations().items():
+        latencies = [c.latency() for c in calls]
+        click.echo(row.format(
+            '%s %s' % (service, operation),
+            len(calls),
+            sum(c.retries for c in calls),
+            sum(1 for c in calls if c.error),
+            '%.0fms' % (percentile(latencies, 50) * 1000),
+            '%.0fms' % (percentile(latencies, 95) * 1000),
+            '%.2fs' % sum(latencies),
+            format_size(sum(c.size for c in calls))), err=True)
+
+    wall = time.monotonic() - tracer.started
+    network = tracer.network_time()
+    click.echo('Wall time %.2fs: %.2fs waiting on AWS, %.2fs local' % (
+        wall, network, max(wall - network, 0)), err=True)
+
+
+class TraceRecorder(object):
+    """
+    Collects spans as Chrome trace events and writes them to `path` in
+    the trace event format Perfetto and chrome://tracing read. Spans of
+    one thread nest by time.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.events = []
+        self._threads = set()
+        self._lock = threading.Lock()
+
+    def add(self, name, category, start, end, args=None):
+        thread = threading.current_thread()
+        event = {
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': start * 1e6,
+            'dur': (end - start) * 1e6,
+            'pid': os.getpid(),
+            'tid': thread.ident,
+        }
+        if args:
+            event['args'] = args
+        with self._lock:
+            if thread.ident not in self._threads:
+                self._threads.add(thread.ident)
+                self.events.append({
+                    'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(),
+                    'tid': thread.ident, 'args': {'name': thread.name}})
+            self.events.append(event)
+
+    def register(self, client, service):
+        """Record the API calls of a botocore client as spans"""
+        events = client.meta.events
+        events.register('before-call', self._before_call)
+        events.register('after-call', partial(self._after_call, service))
+        events.register('after-call-error',
+                        partial(self._after_call, service))
+
+    def _before_call(self, context, **kwargs):
+        context['span_start'] = time.perf_counter()
+
+    def _after_call(self, service, event_name, context, **kwargs):
+        start = context.pop('span_start', None)
+        if start is not None:
+            self.add('%s.%s' % (service, event_name.split('.')[-1]), 'aws',
+                     start, time.perf_counter())
+
+    def write(self):
+        with self._lock:
+            events = list(self.events)
+        with open(self.path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+
+class Span(object):
+    def __init__(self, recorder, name, category, args):
+        self.recorder = recorder
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.recorder.add(self.name, self.category, self.start,
+                          time.perf_counter(), self.args)
+        return False
+
+
+class NullSpan(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+def span(name, category='ecstools', **args):
+    """
+    Context manager recording a span with --trace-file. Costs one global
+    lookup otherwise.
+    """
+    if _recorder is None:
+        return NULL_SPAN
+    return Span(_recorder, name, category, args)
+
+
+def traced(function):
+    """Decorator recording a span per call with --trace-file"""
+    name = function.__qualname__
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        if _recorder is None:
+            return function(*args, **kwargs)
+        with Span(_recorder, name, 'ecstools', None):
+            return function(*args, **kwargs)
+    return wrapper
+
+
+def start_recording(path):
+    global _recorder
+    _recorder = TraceRecorder(path)
+    return _recorder
+
+
+def stop_recording():
+    """Write the recorded spans and stop recording"""
+    global _recorder
+    recorder, _recorder = _recorder, None
+    if recorder is not None:
+        recorder.write()
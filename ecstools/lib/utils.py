@@ -1,10 +1,20 @@
 import sys
+import json
 import time
+import datetime
 import curses
 import click
 
-from ecstools.main import version
-from ecstools.resources.service import Service
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+from ecstools import version
+from ecstools.lib.poller import ServicePoller, FleetPoller, PollInterval, \
+    EventTail, snapshot_state
+from ecstools.lib.screen import Frame, Screen, ENTER_KEYS, BACK_KEYS
+from ecstools.lib.throttling import is_throttling_error
+from ecstools.lib.trace import traced
+from ecstools.resources.service import describe_services
 from ecstools.resources.task_definition import TaskDefinition
 from ecstools.lib.config import config
 
@@ -17,6 +27,36 @@ COLOR_MAP = {
     'YELLOW': 4,
 }
 
+# Upper bound on concurrent describe_target_health calls
+TARGET_HEALTH_WORKERS = 8
+
+# Upper bound on concurrent describe_services calls in cluster top
+DESCRIBE_WORKERS = 4
+
+# Event lines shown per service in the deployments monitor
+MONITOR_EVENT_LINES = 3
+
+# Exit status when some services of a group failed to deploy
+PARTIAL_FAILURE = 2
+
+# Seconds between list_services calls in cluster top
+SERVICES_RELIST_INTERVAL = 60
+
+DASHBOARD_HEALTH_ORDER = ['Failed', 'Unhealthy', 'InProgress', 'Steady']
+
+DASHBOARD_HEALTH_COLORS = {
+    'Failed': COLOR_MAP['RED'],
+    'Unhealthy': COLOR_MAP['RED'],
+    'InProgress': COLOR_MAP['YELLOW'],
+    'Steady': COLOR_MAP['GREEN'],
+}
+
+DASHBOARD_KEYS = (
+    curses.KEY_UP, curses.KEY_DOWN, ord('k'), ord('j'),
+    curses.KEY_PPAGE, curses.KEY_NPAGE, curses.KEY_HOME, curses.KEY_END,
+    ord('g'), ord('G'),
+)
+
 
 def index_generator():
     i = 0
@@ -35,36 +75,157 @@ def init_curses_colors():
     curses.init_pair(COLOR_MAP['YELLOW'], curses.COLOR_YELLOW, -1)
 
 
-def monitor_deployment(ecs, elbv2, cluster, services, interval=5,
-                       exit_on_complete=False):
+def watch_deployments(elbv2, poller, interval=1):
     """
-    Reprint service and deployments info
+    Poll services with `poller` and their target health every `interval`
+    seconds. Polling slows down while nothing changes and when the API
+    throttles.
+    Yields (snapshots, target_health, delay) tuples. snapshots and
+    target_health are None when the poll was throttled.
+    """
+    poll_interval = PollInterval(interval)
+    from botocore.exceptions import ClientError
+    last_state = None
+
+    while True:
+        try:
+            snapshots = poller.poll()
+            target_health = collect_target_health(elbv2, snapshots)
+        except ClientError as e:
+            if not is_throttling_error(e):
+                raise
+            yield None, None, poll_interval.throttled()
+            continue
+
+        state = snapshot_state(snapshots)
+        delay = poll_interval.next(state != last_state)
+        last_state = state
+        yield snapshots, target_health, delay
+
+
+def monitor_deployment(ecs, elbv2, cluster, services, interval=1,
+                       exit_on_complete=False, output='tui'):
+    """
+    Reprint service and deployments info every `interval` seconds.
+    Only changed lines are redrawn; long service groups can be scrolled.
+    With output 'jsonl' a JSON record is printed per service state change
+    instead, which works without a terminal.
     """
-    start_time = time.time()
     if not isinstance(services, list):
         services = [services]
 
+    monitor_poller(ecs, elbv2, ServicePoller(ecs, cluster, services),
+                   interval, exit_on_complete, output)
+
+
+def monitor_fleet_deployment(ecs, elbv2, targets, interval=1,
+                             exit_on_complete=False, output='tui'):
+    """
+    monitor_deployment for services across clusters. `targets` is a list
+    of (cluster, service) pairs.
+    """
+    monitor_poller(ecs, elbv2, FleetPoller(ecs, targets), interval,
+                   exit_on_complete, output)
+
+
+def monitor_poller(ecs, elbv2, poller, interval=1, exit_on_complete=False,
+                   output='tui'):
+    """Run the deployments monitor for the services of `poller`"""
+    if output == 'jsonl':
+        monitor_deployment_jsonl(ecs, elbv2, poller, interval,
+                                 exit_on_complete)
+        return
+
+    start_time = time.time()
+    tail = EventTail(backlog=MONITOR_EVENT_LINES)
+
+    with curses_session() as scr:
+        screen = Screen(scr, pinned=2)
+        for snapshots, target_health, delay in watch_deployments(
+                elbv2, poller, interval):
+            if snapshots is not None:
+                for srv in snapshots:
+                    tail.update(srv)
+                screen.render(deployment_frame(
+                    screen, ecs, snapshots, target_health, start_time,
+                    delay, exit_on_complete, tail=tail))
+            screen.wait(delay)
+
+
+def wait_for_deployments(ecs, targets, interval=1, timeout=None,
+                         output='tui'):
+    """
+    Block until the deployments of the (cluster, service) `targets`
+    complete. Progress is printed whenever it changes, as a status line
+    on stderr or as JSON records with the jsonl `output`.
+    Returns False as soon as a rollout fails or after `timeout` seconds.
+    """
+    poller = FleetPoller(ecs, targets)
+    poll_interval = PollInterval(interval)
+    deadline = None if timeout is None else time.monotonic() + timeout
+    from botocore.exceptions import ClientError
+    last_state = None
+    while True:
+        try:
+            snapshots = poller.poll()
+        except ClientError as e:
+            if not is_throttling_error(e):
+                raise
+            time.sleep(poll_interval.throttled())
+            continue
+
+        state = snapshot_state(snapshots)
+        if state != last_state:
+            print_wait_progress(ecs, snapshots, output)
+
+        if any(service_health(srv.service()) == 'Failed'
+               for srv in snapshots):
+            return False
+        statuses = dict((srv.arn(), deployment_status(srv,
+                                                      srv.deployments()[-1]))
+                        for srv in snapshots)
+        if all_deployments_completed(statuses):
+            return True
+        if deadline is not None and time.monotonic() >= deadline:
+            click.echo('Error: Deployments did not complete within %ss: %s.'
+                       % (timeout, ', '.join(
+                           '%s/%s' % (srv.cluster(), srv.name())
+                           for srv in snapshots
+                           if statuses[srv.arn()] != 'Completed')),
+                       err=True)
+            return False
+
+        time.sleep(poll_interval.next(state != last_state))
+        last_state = state
+
+
+def print_wait_progress(ecs, snapshots, output):
+    if output == 'jsonl':
+        now = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        for srv in snapshots:
+            print_json_record(dict(deployment_record(ecs, srv, []),
+                                   time=now))
+        return
+
+    click.echo('Waiting: %s' % ', '.join(
+        '%s/%s %s %s/%s' % (srv.cluster(), srv.name(),
+                            deployment_status(srv, srv.deployments()[-1]),
+                            srv.running_count(), srv.desired_count())
+        for srv in snapshots), err=True)
+
+
+@contextmanager
+def curses_session():
+    """
+    Set up the terminal for a curses monitor and restore it on exit.
+    Ctrl-C exits cleanly.
+    """
     scr = curses.initscr()
     curses.noecho()
     curses.cbreak()
     init_curses_colors()
-
     try:
-        while True:
-            index = index_generator()
-            gmt, elapsed = get_elapsed_time(start_time)
-
-            header = next(index)
-            scr.addstr(header, 0, f'Elapsed: {elapsed}'
-                       f'  Exit on Complete: {exit_on_complete}')
-            scr.addstr(header, curses.COLS-14, f'version {version}')
-            scr.addstr(next(index), 0, '')
-
-            print_deployment_info(index, scr, ecs, elbv2, cluster,
-                                  services, exit_on_complete)
-            scr.refresh()
-            scr.clear()
-            time.sleep(1)
+        yield scr
     except KeyboardInterrupt:
         sys.exit(0)
     finally:
@@ -73,39 +234,284 @@ def monitor_deployment(ecs, elbv2, cluster, services, interval=5,
         curses.endwin()
 
 
-def print_deployment_info(index, scr, ecs, elbv2, cluster, services,
-                          exit_on_complete):
-    statuses = {}
-    for service in services:
-        srv = Service(ecs, None, cluster, service)
-        tg = get_load_balancer_info(elbv2, srv)
+@traced
+def deployment_frame(screen, ecs, snapshots, target_health, start_time,
+                     delay, exit_on_complete, title='', tail=None):
+    """Returns a Frame with the detailed deployments view"""
+    index = index_generator()
+    gmt, elapsed = get_elapsed_time(start_time)
+    frame = Frame(screen.cols())
 
-        print_service_info(index, scr, srv, tg)
+    header = next(index)
+    frame.addstr(header, 0, f'{title}Elapsed: {elapsed}'
+                 f'  Exit on Complete: {exit_on_complete}'
+                 f'  Next update: {delay:.0f}s')
+    frame.addstr(header, frame.cols-14, f'version {version}')
+    frame.addstr(next(index), 0, '')
+
+    print_deployment_info(index, frame, ecs, snapshots, target_health,
+                          exit_on_complete, tail)
+    return frame
+
+
+def monitor_cluster(ecs, elbv2, cluster, list_services, interval=1):
+    """
+    Show one line per service of a cluster. Services needing attention
+    are listed first. Enter shows the deployments of the selected service.
+    `list_services` is called every SERVICES_RELIST_INTERVAL seconds to
+    pick up new services.
+    """
+    start_time = time.time()
+    poll_interval = PollInterval(interval)
+    services = []
+    descriptions = {}
+    listed_at = None
+    last_state = None
+    selected = None
+
+    with curses_session() as scr:
+        screen = Screen(scr, pinned=2)
+        from botocore.exceptions import ClientError
+        while True:
+            try:
+                if listed_at is None or \
+                        time.time() - listed_at > SERVICES_RELIST_INTERVAL:
+                    services = sorted(list_services())
+                    listed_at = time.time()
+                descriptions = describe_services(
+                    ecs, cluster, services, workers=DESCRIBE_WORKERS,
+                    missing_ok=True)
+                state = dashboard_state(descriptions)
+                delay = poll_interval.next(state != last_state)
+                last_state = state
+            except ClientError as e:
+                if not is_throttling_error(e):
+                    raise
+                delay = poll_interval.throttled()
+
+            rows = sorted(descriptions.values(), key=dashboard_sort_key)
+            names = [r['serviceName'] for r in rows]
+            deadline = time.time() + delay
+            while True:
+                if selected not in names:
+                    selected = names[0] if names else None
+                line = names.index(selected) if selected else 0
+                screen.show_line(line)
+                screen.render(dashboard_frame(
+                    screen, cluster, rows, selected, start_time, delay))
+
+                key = screen.wait(deadline - time.time(),
+                                  keys=DASHBOARD_KEYS + ENTER_KEYS)
+                if key is None:
+                    break
+                if key in ENTER_KEYS and selected:
+                    offset = screen.offset
+                    monitor_service_details(screen, ecs, elbv2, cluster,
+                                            selected, interval)
+                    screen.offset = offset
+                    break
+                if names:
+                    line = max(0, min(len(names) - 1,
+                                      line + dashboard_move(screen, key)))
+                    selected = names[line]
+
+
+def monitor_service_details(screen, ecs, elbv2, cluster, service,
+                            interval):
+    """Show the deployments view of one service until a back key"""
+    start_time = time.time()
+    screen.offset = 0
+    title = f'{cluster} > {service}  (Esc to go back)  '
+    tail = EventTail(backlog=MONITOR_EVENT_LINES)
+    for snapshots, target_health, delay in watch_deployments(
+            elbv2, ServicePoller(ecs, cluster, [service]), interval):
+        if snapshots is not None:
+            for srv in snapshots:
+                tail.update(srv)
+            screen.render(deployment_frame(
+                screen, ecs, snapshots, target_health, start_time, delay,
+                False, title=title, tail=tail))
+        if screen.wait(delay, keys=BACK_KEYS) is not None:
+            return
+
+
+def dashboard_move(screen, key):
+    """Returns how many lines a key moves the dashboard selection"""
+    if key in (curses.KEY_UP, ord('k')):
+        return -1
+    if key in (curses.KEY_DOWN, ord('j')):
+        return 1
+    if key == curses.KEY_PPAGE:
+        return -screen.page_size()
+    if key == curses.KEY_NPAGE:
+        return screen.page_size()
+    if key in (curses.KEY_HOME, ord('g')):
+        return -sys.maxsize
+    return sys.maxsize
+
+
+def service_health(description):
+    """
+    Returns Failed, Unhealthy, InProgress or Steady for a
+    describe_services payload.
+    """
+    deployments = description['deployments']
+    if any(d.get('rolloutState') == 'FAILED' for d in deployments):
+        return 'Failed'
+    if len(deployments) > 1:
+        return 'InProgress'
+    if description['runningCount'] < description['desiredCount']:
+        return 'Unhealthy'
+    return 'Steady'
+
+
+def dashboard_sort_key(description):
+    health = service_health(description)
+    return (DASHBOARD_HEALTH_ORDER.index(health), description['serviceName'])
+
+
+def dashboard_state(descriptions):
+    return sorted((name, d['runningCount'], d['desiredCount'],
+                   d['pendingCount'], len(d['deployments']))
+                  for name, d in descriptions.items())
+
+
+@traced
+def dashboard_frame(screen, cluster, rows, selected, start_time, delay):
+    """Returns a Frame with one line per service"""
+    gmt, elapsed = get_elapsed_time(start_time)
+    frame = Frame(screen.cols())
+    frame.addstr(0, 0, f'Cluster: {cluster}  Services: {len(rows)}'
+                 f'  Elapsed: {elapsed}  Next update: {delay:.0f}s'
+                 '  Enter: details  q: quit')
+    frame.addstr(0, frame.cols-14, f'version {version}')
+    frame.addstr(1, 0, '{:40} {:>9} {:>7} {:>7} {:10} {}'.format(
+        'SERVICE', 'RUNNING', 'PENDING', 'DEPLOYS', 'STATUS',
+        'TASK DEFINITION'), curses.A_BOLD)
+
+    for y, d in enumerate(rows, start=2):
+        health = service_health(d)
+        line = '{:40} {:>9} {:>7} {:>7} {:10} {}'.format(
+            d['serviceName'],
+            '{}/{}'.format(d['runningCount'], d['desiredCount']),
+            d['pendingCount'],
+            len(d['deployments']),
+            health,
+            d['taskDefinition'].split('/')[-1])
+        attr = curses.color_pair(DASHBOARD_HEALTH_COLORS[health])
+        if d['serviceName'] == selected:
+            attr |= curses.A_REVERSE
+        frame.addstr(y, 0, line, attr)
+    return frame
+
+
+def monitor_deployment_jsonl(ecs, elbv2, poller, interval=1,
+                             exit_on_complete=False):
+    """
+    Print a JSON record whenever the state of a service changes.
+    """
+    records = {}
+    tail = EventTail()
+    try:
+        for snapshots, target_health, delay in watch_deployments(
+                elbv2, poller, interval):
+            if snapshots is None:
+                time.sleep(delay)
+                continue
+
+            now = datetime.datetime.now(datetime.timezone.utc).isoformat()
+            statuses = {}
+            for srv in snapshots:
+                events = tail.update(srv)
+                record = deployment_record(ecs, srv, target_health[srv.arn()])
+                statuses[srv.arn()] = record['status']
+                if events or records.get(srv.arn()) != record:
+                    records[srv.arn()] = record
+                    print_json_record(dict(record, time=now, events=[
+                        {'createdAt': e['createdAt'].isoformat(),
+                         'message': e['message']}
+                        for e in events]))
+
+            if exit_on_complete and all_deployments_completed(statuses):
+                sys.exit('All deployments completed.')
+            time.sleep(delay)
+    except KeyboardInterrupt:
+        sys.exit(0)
+
+
+def deployment_record(ecs, srv, target_groups):
+    """Returns the state of a service and its deployments as a dict"""
+    deployments = []
+    for d in srv.deployments():
+        td = TaskDefinition(ecs, d['taskDefinition'])
+        deployments.append({
+            'id': d['id'],
+            'status': d['status'],
+            'taskDefinition': td.revision(),
+            'running': d['runningCount'],
+            'desired': d['desiredCount'],
+            'pending': d['pendingCount'],
+        })
+
+    targets = {}
+    for tg in target_groups:
+        for state, count in tg['counts'].items():
+            targets[state] = targets.get(state, 0) + count
+
+    return {
+        'cluster': srv.cluster(),
+        'service': srv.name(),
+        'status': deployment_status(srv, srv.deployments()[-1]),
+        'running': srv.running_count(),
+        'desired': srv.desired_count(),
+        'pending': srv.pending_count(),
+        'deployments': deployments,
+        'targets': targets,
+    }
+
+
+def print_json_record(record):
+    click.echo(json.dumps(record, separators=(',', ':')))
+
+
+@traced
+def print_deployment_info(index, scr, ecs, services, target_health,
+                          exit_on_complete, tail=None):
+    """
+    Print service and deployments info for a list of Service snapshots.
+    With an EventTail `tail` the latest events of each service scroll by,
+    otherwise only the last event is shown.
+    """
+    statuses = {}
+    for srv in services:
+        print_service_info(index, scr, srv, target_health[srv.arn()])
         status = print_group_deployment_info(ecs, index, scr, srv)
-        statuses[service] = status
+        statuses[srv.arn()] = status
         scr.addstr(next(index), 0, '')
 
-        e = srv.events(1)[0]
-        date = e['createdAt'].replace(microsecond=0)
-        scr.addstr(next(index), 4, f'{date} {e["message"]}',
-                   curses.A_DIM)
+        events = srv.events(1)
+        if tail is not None:
+            events = tail.recent(srv, MONITOR_EVENT_LINES)
+        for e in events:
+            date = e['createdAt'].replace(microsecond=0)
+            scr.addstr(next(index), 4, f'{date} {e["message"]}',
+                       curses.A_DIM)
         scr.addstr(next(index), 0, '')
         scr.addstr(next(index), 0, '')
 
-    scr.addstr(next(index), 0, f'\nCtrl-C to quit the watcher.'
+    scr.addstr(next(index), 0, '\nCtrl-C or q to quit the watcher.'
                ' No deployments will be interrupted.')
 
-    del srv
-
     if deployment_completed(index, scr, statuses, exit_on_complete):
         sys.exit('All deployments completed.')
 
 
-def print_service_info(index, scr, srv, tg):
+def print_service_info(index, scr, srv, target_groups):
     tg_states = ''
     lb_states_color = COLOR_MAP['NO_COLOR']
-    if tg is not None:
-        tg_states = f'  Load Balancer: [ {tg["states"]} ]'
+    if target_groups:
+        tg_states = '  Load Balancer: ' + ' '.join(
+            f'[ {tg["states"]} ]' for tg in target_groups)
 
         if 'draining' in tg_states or 'initial' in tg_states:
             lb_states_color = COLOR_MAP['YELLOW']
@@ -143,23 +549,57 @@ def print_group_deployment_info(ecs, index, scr, srv):
     return deployment_status(srv, d)
 
 
-def get_load_balancer_info(elbv2, srv):
-    for lb in srv.load_balancers():
-        if 'targetGroupArn' in lb:
-            return describe_target_group_info(elbv2, lb)
-    return None
+@traced
+def collect_target_health(elbv2, services, cache=None):
+    """
+    Describe the target health of all target groups of all services
+    concurrently. Each target group is described once per call.
+    Fresh responses in the MetadataCache `cache` are not described again.
+    Returns a dict of target group summaries lists keyed by service ARN.
+    """
+    lbs = [(srv, lb) for srv in services for lb in srv.load_balancers()
+           if 'targetGroupArn' in lb]
+    arns = sorted(set(lb['targetGroupArn'] for _, lb in lbs))
+
+    descriptions = {}
+    if cache is not None:
+        for arn in arns:
+            targets = cache.get('target-health', arn)
+            if targets is not None:
+                descriptions[arn] = targets
+    remaining = [arn for arn in arns if arn not in descriptions]
+
+    if remaining:
+        workers = min(TARGET_HEALTH_WORKERS, len(remaining))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(lambda arn: elbv2.describe_target_health(
+                TargetGroupArn=arn), remaining)
+            for arn, targets in zip(remaining, results):
+                descriptions[arn] = targets['TargetHealthDescriptions']
+                if cache is not None:
+                    cache.set('target-health', arn, descriptions[arn])
+
+    target_health = dict((srv.arn(), []) for srv in services)
+    for srv, lb in lbs:
+        target_health[srv.arn()].append(target_group_summary(
+            lb, descriptions[lb['targetGroupArn']]))
+    return target_health
 
 
 def describe_target_group_info(elbv2, lb):
     targets = elbv2.describe_target_health(TargetGroupArn=lb['targetGroupArn'])
+    return target_group_summary(lb, targets['TargetHealthDescriptions'])
+
 
-    states = target_health_states(targets['TargetHealthDescriptions'])
+def target_group_summary(lb, target_health_descriptions):
+    states = target_health_states(target_health_descriptions)
 
     summary = {
         'group': lb['targetGroupArn'].split('/')[-2],
         'container': lb['containerName'],
         'port': lb['containerPort'],
         'states': ' '.join(['{}: {}'.format(k, v) for k, v in states.items()]),
+        'counts': states,
         'healthy': all_containers_are_healthy(states)
     }
     return summary
@@ -196,9 +636,13 @@ def get_elapsed_time(start_time):
     return gmt, elapsed
 
 
+def all_deployments_completed(statuses):
+    return all([x == 'Completed' for x in statuses.values()])
+
+
 def deployment_completed(index, scr, statuses, exit_on_complete):
     if exit_on_complete:
-        if all([x == 'Completed' for x in statuses.values()]):
+        if all_deployments_completed(statuses):
             scr.addstr(next(index), 0, 'All deployments completed.',
                        curses.A_STANDOUT)
             return True
@@ -211,6 +655,22 @@ def merge_two_dicts(x, y):
     return z
 
 
+def print_failed_deployments(failed):
+    if failed:
+        click.echo('Error: Failed to deploy %s.' % ', '.join(failed),
+                   err=True)
+
+
+def exit_if_failed(failed):
+    """
+    Print the failed services and exit with PARTIAL_FAILURE, whatever the
+    monitor exited with, so that scripts notice partial failures.
+    """
+    if failed:
+        print_failed_deployments(failed)
+        sys.exit(PARTIAL_FAILURE)
+
+
 def get_group_services(service):
     try:
         if service in config['service-group']:
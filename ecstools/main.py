@@ -1,26 +1,24 @@
-import os
 import sys
-import boto3
 import click
 
-from botocore.exceptions import ProfileNotFound, NoRegionError
+from ecstools import version
 from ecstools.lib.cli import AliasedGroup, Subcommand
-
-version = '0.2.7'
-
-commands_dir = os.path.join(os.path.dirname(__file__), 'commands')
+from ecstools.lib.client import Clients
 
 
 class ClusterCommand(Subcommand):
-    plugin_folder = os.path.join(commands_dir, 'cluster')
+    plugin_package = 'ecstools.commands.cluster'
+    entry_point_group = 'ecstools.commands.cluster'
 
 
 class ServiceCommand(Subcommand):
-    plugin_folder = os.path.join(commands_dir, 'service')
+    plugin_package = 'ecstools.commands.service'
+    entry_point_group = 'ecstools.commands.service'
 
 
 class TaskDefinitionCommand(Subcommand):
-    plugin_folder = os.path.join(commands_dir, 'task-definition')
+    plugin_package = 'ecstools.commands.task-definition'
+    entry_point_group = 'ecstools.commands.task-definition'
 
 
 @click.command(cls=AliasedGroup)
@@ -28,29 +26,57 @@ class TaskDefinitionCommand(Subcommand):
 @click.version_option(version=version, message=version)
 @click.option('-p', '--profile', help='AWS profile')
 @click.option('-r', '--region', help='AWS region')
-def cli(ctx, region, profile):
+@click.option('--refresh', is_flag=True,
+              help='Ignore cached responses and fetch them again')
+@click.option('--offline', is_flag=True,
+              help='Serve cached responses only and make no API calls')
+@click.option('--trace-api', is_flag=True,
+              help='Print a summary of the AWS API calls at exit')
+@click.option('--trace-file', type=click.Path(dir_okay=False, writable=True),
+              help='Write a Chrome trace of the run to this file')
+def cli(ctx, region, profile, refresh, offline, trace_api, trace_file):
     """AWS ECS deploy tools"""
+    # Help pages and shell completion need no session
+    if ctx.resilient_parsing or ctx.meta.get('help_requested'):
+        return
+
+    # boto3 is slow to import. Import it only once a command runs so that
+    # --help, --version and shell completion stay fast.
+    import boto3
+    from botocore.exceptions import ProfileNotFound, NoRegionError
+    from ecstools.lib import cache, throttling
+
     try:
         sess = boto3.session.Session(profile_name=profile, region_name=region)
     except ProfileNotFound as e:
         click.echo(e, err=True)
         sys.exit(1)
 
-    try:
-        ecs = sess.client('ecs')
-        ecr = sess.client('ecr')
-        elbv2 = sess.client('elbv2')
-    except NoRegionError as e:
-        click.echo(e, err=True)
+    if sess.region_name is None:
+        click.echo(NoRegionError(), err=True)
         sys.exit(1)
 
-    ctx.obj = {
-        'region': region,
-        'profile': profile,
-        'ecs': ecs,
-        'ecr': ecr,
-        'elbv2': elbv2
-    }
+    scheduler = throttling.configure()
+    tracers = []
+    if trace_api:
+        from ecstools.lib.trace import ApiTracer, print_trace_summary
+        tracer = ApiTracer()
+        tracers.append(tracer)
+        ctx.call_on_close(lambda: print_trace_summary(tracer))
+    if trace_file:
+        from ecstools.lib import trace
+        tracers.append(trace.start_recording(trace_file))
+        ctx.call_on_close(trace.stop_recording)
+
+    ctx.obj = Clients(sess, scheduler=scheduler, tracers=tracers,
+                      offline=offline,
+                      region=region, profile=profile,
+                      cache=cache.configure(sess.profile_name,
+                                            sess.region_name,
+                                            refresh=refresh,
+                                            offline=offline))
+    ctx.call_on_close(
+        lambda: throttling.print_throttling_summary(scheduler))
 
 
 @cli.group(cls=ClusterCommand)
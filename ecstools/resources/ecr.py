@@ -1,7 +1,12 @@
 import sys
 import click
 
-from botocore.exceptions import ClientError
+from ecstools.lib.cache import image_digests
+from ecstools.lib.trace import traced
+
+
+# describe_images accepts at most 100 image ids per call
+DESCRIBE_IMAGES_BATCH_SIZE = 100
 
 
 class Ecr(object):
@@ -9,21 +14,74 @@ class Ecr(object):
         self.ecr = ecr
 
     def verify_image_in_ecr(self, image, tag):
+        self.resolve_digests([(image, tag)])
+
+    @traced
+    def resolve_digests(self, images, missing_ok=False):
+        """
+        Resolve (repository, tag) pairs to image digests. Tags which are
+        not in the image digest cache are described with one
+        describe_images call per repository.
+        Returns a dict of digests keyed by the pairs. Missing images are
+        None with `missing_ok`, otherwise they exit.
+        """
+        digests = {}
+        missing = {}
+        for repository, tag in images:
+            digest = image_digests.get(self.ecr, repository, tag)
+            if digest is None:
+                missing.setdefault(repository, set()).add(tag)
+            digests[(repository, tag)] = digest
+
+        for repository, tags in sorted(missing.items()):
+            tags = sorted(tags)
+            for i in range(0, len(tags), DESCRIBE_IMAGES_BATCH_SIZE):
+                batch = tags[i:i + DESCRIBE_IMAGES_BATCH_SIZE]
+                for tag, digest in self._describe_digests(
+                        repository, batch).items():
+                    digests[(repository, tag)] = digest
+
+        if not missing_ok:
+            for (repository, tag), digest in sorted(digests.items()):
+                if digest is None:
+                    click.echo('Image not found: %s:%s' % (repository, tag),
+                               err=True)
+                    sys.exit(1)
+        return digests
+
+    def _describe_digests(self, repository, tags):
+        """
+        Returns a dict of digests keyed by tag. Missing tags are None.
+        """
+        from botocore.exceptions import ClientError
         try:
-            self.ecr.describe_images(
-                repositoryName=image,
-                imageIds=[
-                    {
-                        'imageTag': tag
-                    },
-                ],
+            response = self.ecr.describe_images(
+                repositoryName=repository,
+                imageIds=[{'imageTag': tag} for tag in tags],
                 filter={
                     'tagStatus': 'TAGGED'
                 }
             )
         except ClientError as e:
-            if e.response['Error']['Code'] == 'ImageNotFoundException':
-                click.echo('Image not found: %s' % e, err=True)
-            else:
-                click.echo(e, err=True)
+            code = e.response['Error']['Code']
+            if code == 'ImageNotFoundException' and len(tags) > 1:
+                # The whole call fails if any tag is missing. Find out
+                # which ones one by one.
+                digests = {}
+                for tag in tags:
+                    digests.update(self._describe_digests(repository, [tag]))
+                return digests
+            if code in ('ImageNotFoundException',
+                        'RepositoryNotFoundException'):
+                return dict((tag, None) for tag in tags)
+            click.echo(e, err=True)
             sys.exit(1)
+
+        digests = dict((tag, None) for tag in tags)
+        for image in response['imageDetails']:
+            for tag in image.get('imageTags', []):
+                image_digests.set(self.ecr, repository, tag,
+                                  image['imageDigest'])
+                if tag in digests:
+                    digests[tag] = image['imageDigest']
+        return digests
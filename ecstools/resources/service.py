@@ -1,52 +1,154 @@
 import sys
 import click
 
-from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
 
-from ecstools.resources.task_definition import TaskDefinition
+from ecstools.lib.paginate import paginate
+from ecstools.lib.throttling import is_throttling_error
+from ecstools.lib.trace import traced
+from ecstools.lib.cache import task_definitions, task_definition_index
+from ecstools.resources.task_definition import TaskDefinition, content_hash
 from ecstools.resources.ecr import Ecr
 
 
+# describe_services accepts at most 10 services per call
+DESCRIBE_SERVICES_BATCH_SIZE = 10
+# describe_tasks accepts at most 100 tasks per call
+DESCRIBE_TASKS_BATCH_SIZE = 100
+
+
+@traced
+def describe_services(ecs, cluster, services, workers=1, missing_ok=False,
+                      cache=None):
+    """
+    Describe services in batches of DESCRIBE_SERVICES_BATCH_SIZE, with up
+    to `workers` batches in flight.
+    Returns a dict of service descriptions keyed by the requested names.
+    Missing services are left out with `missing_ok`, otherwise they exit.
+    Fresh descriptions in the MetadataCache `cache` are not described again.
+    Throttling errors are raised so pollers can back off.
+    """
+    descriptions = {}
+    if cache is not None:
+        for name in services:
+            description = cache.get('service-descriptions',
+                                    '%s/%s' % (cluster, name))
+            if description is not None:
+                descriptions[name] = description
+    remaining = [s for s in services if s not in descriptions]
+
+    batches = [remaining[i:i + DESCRIBE_SERVICES_BATCH_SIZE]
+               for i in range(0, len(remaining),
+                              DESCRIBE_SERVICES_BATCH_SIZE)]
+
+    def describe(batch):
+        result = _describe_services_batch(ecs, cluster, batch, missing_ok)
+        if cache is not None:
+            for name, description in result.items():
+                cache.set('service-descriptions', '%s/%s' % (cluster, name),
+                          description)
+        return result
+
+    if workers > 1 and len(batches) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for result in pool.map(describe, batches):
+                descriptions.update(result)
+    else:
+        for batch in batches:
+            descriptions.update(describe(batch))
+    return descriptions
+
+
+def _describe_services_batch(ecs, cluster, batch, missing_ok):
+    from botocore.exceptions import ClientError
+    try:
+        response = ecs.describe_services(cluster=cluster, services=batch)
+    except ClientError as e:
+        if is_throttling_error(e):
+            raise
+        if e.response['Error']['Code'] == 'ClusterNotFoundException':
+            click.echo('Cluster not found.', err=True)
+        else:
+            click.echo(e, err=True)
+        sys.exit(1)
+
+    found = {}
+    for s in response['services']:
+        found[s['serviceName']] = s
+        found[s['serviceArn']] = s
+
+    descriptions = {}
+    for name in batch:
+        if name in found:
+            descriptions[name] = found[name]
+        elif not missing_ok:
+            click.echo('Service not found: %s' % name, err=True)
+            sys.exit(1)
+    return descriptions
+
+
+def print_registration(td, reused):
+    if reused:
+        click.secho('Reusing task definition: %s' % td.revision(),
+                    fg='green')
+    else:
+        click.secho('Registered new task definition: %s' % td.revision(),
+                    fg='green')
+
+
 class Service(object):
-    def __init__(self, ecs, ecr, cluster, service):
+    def __init__(self, ecs, ecr, cluster, service, description=None):
+        """
+        The service is described and its task definition fetched on first
+        access. Pass an already fetched describe_services payload as
+        `description` to skip the describe_services call.
+        """
         self.ecs = ecs
         self.ecr = ecr
         self._cluster = cluster
         self._service_name = service
-        self._service = self._describe_service()
-        self._td = TaskDefinition(self.ecs, self._service['taskDefinition'])
+        self._service = description
+        self._td = None
 
     def service(self):
+        if self._service is None:
+            self._service = self._describe_service()
         return self._service
 
     def name(self):
         return self._service_name
 
+    def arn(self):
+        return self.service()['serviceArn']
+
     def cluster(self):
         return self._cluster
 
     def desired_count(self):
-        return self._service['desiredCount']
+        return self.service()['desiredCount']
 
     def running_count(self):
-        return self._service['runningCount']
+        return self.service()['runningCount']
 
     def pending_count(self):
-        return self._service['pendingCount']
+        return self.service()['pendingCount']
 
     def deployments(self):
-        return self._service['deployments']
+        return self.service()['deployments']
 
     def load_balancers(self):
-        return self._service['loadBalancers']
+        return self.service()['loadBalancers']
 
     def launch_type(self):
-        return self._service.get('launchType', '')
+        return self.service().get('launchType', '')
 
     def events(self, number):
-        return self._service['events'][:number]
+        return self.service()['events'][:number]
 
     def task_definition(self):
+        if self._td is None:
+            self._td = TaskDefinition(self.ecs,
+                                      self.service()['taskDefinition'])
         return self._td
 
     def containers(self):
@@ -55,35 +157,20 @@ class Service(object):
     def images(self):
         return self.task_definition().images()
 
+    @traced
     def deploy_tags(self, tags, count, verbose):
         """
         Redeploy the current task definition if all tags are already deployed.
         Otherwise, deploy the updated task definition with the new tags.
         """
         if self._are_images_in_current_task_definition(tags):
-            self._redeploy_current_task_definition(count, verbose)
+            self._redeploy_current_task_definition(tags, count, verbose)
             return
 
         td_dict = self.update_task_definition_images(tags)
         td = self.register_task_definition(td_dict, verbose)
-        self.deploy_task_tags(td.arn())
         self.deploy_task_definition(td, verbose, count)
 
-    def deploy_task_tags(self, new_td_arn):
-        """
-        Copy tags from previous task definition
-        """
-        response = self.ecs.list_tags_for_resource(
-            resourceArn=self.task_definition().arn()
-        )
-        if len(response['tags']) == 0:
-            pass
-        else:
-            self.ecs.tag_resource(
-                resourceArn=new_td_arn,
-                tags=response['tags']
-            )
-
     def deploy_task_definition(self, taskDefinition, verbose, count=None):
         if verbose:
             click.secho('Deploying %s to %s %s...' % (
@@ -102,7 +189,9 @@ class Service(object):
             params['desiredCount'] = count
         self.update_service(**params)
 
+    @traced
     def _describe_service(self):
+        from botocore.exceptions import ClientError
         try:
             response = self.ecs.describe_services(
                 cluster=self.cluster(),
@@ -119,7 +208,9 @@ class Service(object):
             click.echo('Service not found.', err=True)
             sys.exit(1)
 
+    @traced
     def update_service(self, **params):
+        from botocore.exceptions import ClientError
         try:
             self.ecs.update_service(**params)
         except ClientError as e:
@@ -134,17 +225,71 @@ class Service(object):
         Returns an updated task definition dict.
         """
         td_dict = self.task_definition().copy_task_definition()
-        ecr = Ecr(self.ecr)
+        images = [(self.task_definition().image(index), tag)
+                  for index, tag in enumerate(tags)]
+        Ecr(self.ecr).resolve_digests(
+            [(current['image'], tag) for current, tag in images])
 
-        for tag in tags:
-            index = tags.index(tag)
-            current = self.task_definition().image(index)
+        for index, (current, tag) in enumerate(images):
             repo_uri = '{}/{}'.format(current['repo'], current['image'])
             image_uri = '{}:{}'.format(repo_uri, tag)
-            ecr.verify_image_in_ecr(current['image'], tag)
             td_dict['containerDefinitions'][index]['image'] = image_uri
         return td_dict
 
+    def image_digest_requests(self, tags):
+        """
+        Returns the (repository, tag) pairs of the images of a deployment
+        of `tags`.
+        """
+        return [(self.task_definition().image(index)['image'], tag)
+                for index, tag in enumerate(tags)]
+
+    def running_image_digests(self):
+        """
+        Returns the sets of image digests the running tasks of the current
+        task definition run, keyed by container name.
+        """
+        from botocore.exceptions import ClientError
+        digests = {}
+        try:
+            arns = list(paginate(self.ecs.list_tasks, 'taskArns',
+                                 cluster=self.cluster(),
+                                 serviceName=self.name(),
+                                 desiredStatus='RUNNING'))
+            for i in range(0, len(arns), DESCRIBE_TASKS_BATCH_SIZE):
+                tasks = self.ecs.describe_tasks(
+                    cluster=self.cluster(),
+                    tasks=arns[i:i + DESCRIBE_TASKS_BATCH_SIZE])['tasks']
+                for task in tasks:
+                    if task['taskDefinitionArn'] != \
+                            self.task_definition().arn():
+                        continue
+                    for c in task.get('containers', []):
+                        if c.get('imageDigest'):
+                            digests.setdefault(c['name'], set()).add(
+                                c['imageDigest'])
+        except ClientError as e:
+            click.echo(e.response['Error']['Message'], err=True)
+            sys.exit(1)
+        return digests
+
+    def moved_images(self, tags):
+        """
+        Returns the names of the containers whose tag in `tags` points to
+        another image in ECR than the running tasks run.
+        """
+        digests = Ecr(self.ecr).resolve_digests(
+            self.image_digest_requests(tags), missing_ok=True)
+        running = self.running_image_digests()
+        moved = []
+        for index, tag in enumerate(tags):
+            current = self.task_definition().image(index)
+            new = digests[(current['image'], tag)]
+            if new is not None and \
+                    running.get(current['container'], set()) - set([new]):
+                moved.append(current['container'])
+        return moved
+
     def update_container_environment(self, container, environment):
         """
         Creates a copy of the current task definition.
@@ -161,35 +306,97 @@ class Service(object):
 
     def register_task_definition(self, td_dict, verbose):
         """
-        Register a new task definition.
+        Register a new task definition, unless there is an active revision
+        with the same content already.
         Returns a new task definition object.
         """
-        try:
-            result = self.ecs.register_task_definition(**td_dict)
-        except ClientError as e:
-            if e.response['Error']['Code'] == 'AccessDeniedException':
-                click.echo(e, err=True)
-            else:
-                click.echo(e, err=True)
-            sys.exit(1)
-
-        td_rev = result['taskDefinition']['taskDefinitionArn'].split('/')[-1]
-        new_td = TaskDefinition(self.ecs, td_rev)
-
+        new_td, reused = self.find_or_register_task_definition(td_dict)
         if verbose:
-            click.secho('Registered new task definition: %s' %
-                        new_td.revision(), fg='green')
+            print_registration(new_td, reused)
         return new_td
 
-    def _redeploy_current_task_definition(self, count, verbose):
+    @traced
+    def find_or_register_task_definition(self, td_dict):
+        """
+        Like register_task_definition, without printing.
+        Returns the task definition object and whether it was reused.
+        """
+        self._index_current_task_definition()
+        digest = content_hash(td_dict)
+        # Services sharing a task definition register it only once
+        with task_definition_index.lock(self.ecs, digest):
+            new_td = self._find_task_definition(digest)
+            if new_td is not None:
+                return new_td, True
+
+            from botocore.exceptions import ClientError
+            try:
+                result = self.ecs.register_task_definition(**td_dict)
+            except ClientError as e:
+                if e.response['Error']['Code'] == 'AccessDeniedException':
+                    click.echo(e, err=True)
+                else:
+                    click.echo(e, err=True)
+                sys.exit(1)
+
+            # The response has the whole revision, no need to describe it
+            description = result['taskDefinition']
+            new_td = TaskDefinition(self.ecs,
+                                    description['taskDefinitionArn'],
+                                    description=description,
+                                    tags=result.get('tags',
+                                                    td_dict.get('tags', [])))
+            task_definition_index.set(self.ecs, digest, new_td.arn())
+        return new_td, False
+
+    def _index_current_task_definition(self):
+        current = self.task_definition()
+        if current.status() == 'ACTIVE':
+            task_definition_index.store(self.ecs, current.content_hash(),
+                                        current.arn())
+
+    def _find_task_definition(self, digest):
+        """
+        Returns the active revision with the content hash `digest` or None
+        """
+        arn = task_definition_index.get(self.ecs, digest)
+        if arn is not None:
+            return TaskDefinition(self.ecs, arn)
+
+        arn = task_definition_index.get_stored(self.ecs, digest)
+        if arn is None:
+            return None
+        # Stored revisions may have been deregistered since
+        from botocore.exceptions import ClientError
+        try:
+            td = self.ecs.describe_task_definition(taskDefinition=arn)
+        except ClientError as e:
+            if is_throttling_error(e):
+                raise
+            return None
+        if td['taskDefinition']['status'] != 'ACTIVE':
+            return None
+        task_definitions.set(self.ecs, td['taskDefinition'])
+        return TaskDefinition(self.ecs, arn)
+
+    def _redeploy_current_task_definition(self, tags, count, verbose):
         if verbose:
-            click.secho(
-                'The images are already in the current task definition.')
+            moved = self.moved_images(tags)
+            if moved:
+                click.secho('The tags of %s point to new images.' %
+                            ', '.join(moved))
+            else:
+                click.secho(
+                    'The images are already in the current task definition.')
             click.secho(('Forcing a new deployment of %s' %
                          self.task_definition().revision()), fg='white')
         self.deploy_task_definition(self.task_definition(),
                                     verbose, count)
 
     def _are_images_in_current_task_definition(self, tags):
-        current_tags = [i['tag'] for i in self.images()]
-        return all([x in current_tags for x in tags])
+        """
+        Compares the tags container by container. A tag moved to another
+        image is redeployed with the current task definition as well.
+        """
+        return all(self.task_definition().image(index)['tag'] == tag
+                   for index, tag in enumerate(tags))
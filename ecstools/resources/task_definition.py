@@ -1,27 +1,100 @@
 import sys
+import copy
+import json
 import click
+import hashlib
 
-from botocore.exceptions import ClientError
+from ecstools.lib.cache import task_definitions, task_definition_tags
+from ecstools.lib.trace import traced
+
+
+# Container definition lists whose order does not matter
+UNORDERED_CONTAINER_LISTS = ('environment', 'secrets')
+
+
+def content_hash(td_dict):
+    """
+    Hash of a task definition dict as returned by copy_task_definition.
+    Empty values, key order and the order of environment variables and
+    secrets do not change the hash.
+    """
+    canonical = _canonical(td_dict)
+    for c in canonical.get('containerDefinitions', []):
+        for key in UNORDERED_CONTAINER_LISTS:
+            if key in c:
+                c[key] = sorted(c[key], key=lambda e: e['name'])
+    document = json.dumps(canonical, sort_keys=True, default=str)
+    return hashlib.sha256(document.encode('utf-8')).hexdigest()
+
+
+def _canonical(value):
+    if isinstance(value, dict):
+        return dict((k, _canonical(v)) for k, v in value.items()
+                    if v not in (None, [], {}))
+    if isinstance(value, list):
+        return [_canonical(v) for v in value]
+    return value
 
 
 class TaskDefinition(object):
-    def __init__(self, ecs, taskDefinition):
+    @traced
+    def __init__(self, ecs, taskDefinition, description=None, tags=None):
+        """
+        Pass a task definition returned by the API, e.g. by
+        register_task_definition, as `description` to skip describing it.
+        Its `tags` can be passed along to skip looking them up.
+        """
         self.ecs = ecs
         self.taskDefinition = taskDefinition
-        self.td = self.describe_task_definition()
+        self.td = description
+        if self.td is None:
+            self.td = task_definitions.get(ecs, taskDefinition)
+        if self.td is None:
+            self.td, tags = self.describe_task_definition()
+            task_definitions.set(ecs, self.td)
+        elif description is not None:
+            task_definitions.set(ecs, self.td)
+        if tags is not None:
+            task_definition_tags.set(ecs, self.arn(), tags)
 
     def describe_task_definition(self):
+        """Describe the task definition. Returns it and its tags."""
+        from botocore.exceptions import ClientError
         try:
-            params = {'taskDefinition': self.taskDefinition}
+            params = {'taskDefinition': self.taskDefinition,
+                      'include': ['TAGS']}
             res = self.ecs.describe_task_definition(**params)
         except ClientError as e:
             click.echo(e.response['Error']['Message'], err=True)
             sys.exit(1)
-        return res['taskDefinition']
+        return res['taskDefinition'], res.get('tags', [])
 
     def arn(self):
         return self.td['taskDefinitionArn']
 
+    def tags(self):
+        """
+        Returns the tags of the revision. They are described along with
+        it, the tags of cached revisions are looked up.
+        """
+        tags = task_definition_tags.get(self.ecs, self.arn())
+        if tags is None:
+            from botocore.exceptions import ClientError
+            try:
+                res = self.ecs.list_tags_for_resource(resourceArn=self.arn())
+            except ClientError as e:
+                click.echo(e.response['Error']['Message'], err=True)
+                sys.exit(1)
+            tags = res['tags']
+            task_definition_tags.set(self.ecs, self.arn(), tags)
+        return tags
+
+    def status(self):
+        return self.td.get('status', 'ACTIVE')
+
+    def content_hash(self):
+        return content_hash(self.copy_task_definition())
+
     def name(self):
         return self.td['family']
 
@@ -83,6 +156,8 @@ class TaskDefinition(object):
     def copy_task_definition(self):
         """
         Copy task definition and cleanup aws reserved params.
+        The copy is deep since the described task definition is shared
+        through the task definition cache.
         """
         aws_reserved_params = ['status',
                                'compatibilities',
@@ -92,8 +167,16 @@ class TaskDefinition(object):
                                'revision',
                                'requiresAttributes'
                                ]
-        new_td = self.td.copy()
+        new_td = copy.deepcopy(self.td)
+        # Revisions cached by earlier versions may still have their tags
+        new_td.pop('tags', None)
 
         for k in aws_reserved_params:
-            del new_td[k]
+            # Not every revision has all of them, e.g. registeredBy
+            new_td.pop(k, None)
+
+        # Tags are passed to register_task_definition along with the rest
+        tags = self.tags()
+        if tags:
+            new_td['tags'] = copy.deepcopy(tags)
         return new_td
@@ -0,0 +1,127 @@
+"""
+Benchmarks run against synthetic fleets in moto. Run them with
+
+    BENCHMARK_FLEET_SIZES=10,100,1000 \
+        python -m pytest ecstools/tests/benchmarks --benchmark-autosave
+
+and compare with an earlier run with --benchmark-compare. Regular test
+runs use a 10 service fleet only.
+"""
+import os
+
+import pytest
+import boto3
+from moto import mock_ec2, mock_elbv2
+
+from ecstools.lib import cache
+from ecstools.lib.throttling import RequestScheduler
+from ecstools.tests.conftest import push_image
+
+
+REGION = 'eu-west-1'
+
+# Images of the containers of every task definition
+REPOSITORIES = ['bench-web', 'bench-proxy', 'bench-log']
+
+# Services sharing a task definition family
+SERVICES_PER_FAMILY = 10
+
+# Revisions of the first family, more than `task-definition ls` lists
+HISTORY_REVISIONS = 60
+
+
+def pytest_generate_tests(metafunc):
+    if 'fleet_size' in metafunc.fixturenames:
+        sizes = os.environ.get('BENCHMARK_FLEET_SIZES', '10').split(',')
+        metafunc.parametrize('fleet_size', [int(s) for s in sizes],
+                             scope='session')
+
+
+class Fleet(object):
+    """A cluster of `size` services with load balancers in moto"""
+
+    def __init__(self, size):
+        self.size = size
+        self.region = REGION
+        self.cluster = 'bench-%s' % size
+        self.services = ['svc%04d' % n for n in range(size)]
+        self.families = []
+
+    def create(self, vpc):
+        ecs = boto3.client('ecs', region_name=self.region)
+        elbv2 = boto3.client('elbv2', region_name=self.region)
+        ecs.create_cluster(clusterName=self.cluster)
+
+        for n, service in enumerate(self.services):
+            if n % SERVICES_PER_FAMILY == 0:
+                family = '%s-%s' % (self.cluster, n)
+                revisions = 1 if self.families else HISTORY_REVISIONS
+                for _ in range(revisions):
+                    ecs.register_task_definition(
+                        family=family, cpu='512', memory='1024',
+                        containerDefinitions=container_definitions('v1'))
+                self.families.append(family)
+
+            tg = elbv2.create_target_group(
+                Name='%s-%s' % (self.cluster, service), Protocol='HTTP',
+                Port=80, VpcId=vpc)['TargetGroups'][0]['TargetGroupArn']
+            ecs.create_service(
+                cluster=self.cluster, serviceName=service,
+                taskDefinition=family, desiredCount=1,
+                loadBalancers=[{'targetGroupArn': tg,
+                                'containerName': REPOSITORIES[0],
+                                'containerPort': 80}])
+        return self
+
+
+def container_definitions(tag):
+    return [{
+        'name': repository,
+        'image': '123456789012.dkr.ecr.%s.amazonaws.com/%s:%s' % (
+            REGION, repository, tag),
+        'cpu': 128,
+        'memory': 256,
+        'essential': True,
+    } for repository in REPOSITORIES]
+
+
+@pytest.fixture(scope='session')
+def aws():
+    """Starts the moto services the benchmarks need on top of ecs/ecr"""
+    mock_ec2().start()
+    mock_elbv2().start()
+
+    ecr = boto3.client('ecr', region_name=REGION)
+    for repository in REPOSITORIES:
+        ecr.create_repository(repositoryName=repository)
+        for tag in ('v1', 'v2', 'v3'):
+            push_image(ecr, repository, tag, layer=tag)
+
+    ec2 = boto3.client('ec2', region_name=REGION)
+    yield ec2.create_vpc(CidrBlock='10.0.0.0/16')['Vpc']['VpcId']
+    mock_elbv2().stop()
+    mock_ec2().stop()
+
+
+@pytest.fixture(scope='session')
+def fleet(aws, fleet_size):
+    return Fleet(fleet_size).create(aws)
+
+
+@pytest.fixture
+def api_calls(mocker):
+    """
+    Counts the AWS calls of cli runs per (service, operation) through the
+    request scheduler, without pacing them.
+    """
+    scheduler = RequestScheduler(rates={'ecs': 10 ** 6, 'ecr': 10 ** 6,
+                                        'elbv2': 10 ** 6})
+    mocker.patch('ecstools.lib.throttling.configure', return_value=scheduler)
+    return scheduler
+
+
+def cold_caches():
+    """Forget what earlier rounds described"""
+    cache.task_definitions.memory.clear()
+    cache.image_digests.memory.clear()
+    cache.task_definition_tags.memory.clear()
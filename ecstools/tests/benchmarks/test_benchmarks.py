@@ -0,0 +1,120 @@
+import itertools
+
+import boto3
+import pytest
+from click.testing import CliRunner
+
+import ecstools.main as main
+import ecstools.lib.utils as utils
+from ecstools.lib.poller import ServicePoller
+from ecstools.lib.screen import Frame
+from ecstools.tests.benchmarks.conftest import cold_caches, REPOSITORIES, \
+    HISTORY_REVISIONS
+
+
+pytest.importorskip('pytest_benchmark')
+
+
+def run_cli(fleet, *args):
+    # Responses cached by earlier rounds are not served
+    result = CliRunner().invoke(
+        main.cli, ['-r', fleet.region, '--refresh'] + list(args))
+    assert result.exit_code == 0, result.output
+    return result
+
+
+def measure(benchmark, api_calls, function, rounds=3, setup=None):
+    """
+    Benchmark `function` with cold caches. Returns the API calls of the
+    last round per 'service.Operation' and saves them with the results.
+    """
+    def cold_setup():
+        cold_caches()
+        api_calls.calls.clear()
+        if setup is not None:
+            return setup()
+
+    benchmark.pedantic(function, setup=cold_setup, rounds=rounds,
+                       iterations=1)
+    calls = dict(('%s.%s' % op, count)
+                 for op, count in sorted(api_calls.calls.items()))
+    benchmark.extra_info['api_calls'] = calls
+    return calls
+
+
+def batches(count, size):
+    return -(-count // size)
+
+
+class TestBenchmarks(object):
+    def test_service_ls_all_stats(self, benchmark, api_calls, fleet):
+        calls = measure(benchmark, api_calls, lambda: run_cli(
+            fleet, 'service', 'ls', fleet.cluster, '-a'))
+
+        assert calls == {
+            'ecs.ListServices': batches(fleet.size, 100),
+            'ecs.DescribeServices': batches(fleet.size, 10),
+            'ecs.DescribeTaskDefinition': len(fleet.families),
+        }
+
+    def test_monitor_tick(self, benchmark, api_calls, fleet, mocker):
+        ecs = boto3.client('ecs', region_name=fleet.region)
+        elbv2 = boto3.client('elbv2', region_name=fleet.region)
+        api_calls.register(ecs, 'ecs')
+        api_calls.register(elbv2, 'elbv2')
+        poller = ServicePoller(ecs, fleet.cluster, fleet.services)
+        # Frames are drawn without a terminal
+        mocker.patch('ecstools.lib.utils.curses.color_pair', return_value=0)
+
+        def tick():
+            snapshots, target_health, _ = next(
+                utils.watch_deployments(elbv2, poller))
+            utils.print_deployment_info(
+                utils.index_generator(), Frame(200), ecs, snapshots,
+                target_health, False)
+
+        calls = measure(benchmark, api_calls, tick)
+
+        assert calls == {
+            'ecs.DescribeServices': batches(fleet.size, 10),
+            'ecs.DescribeTaskDefinition': len(fleet.families),
+            'elbv2.DescribeTargetHealth': fleet.size,
+        }
+
+    def test_task_definition_ls(self, benchmark, api_calls, fleet):
+        family = fleet.families[0]
+        results = []
+        calls = measure(benchmark, api_calls, lambda: results.append(run_cli(
+            fleet, 'task-definition', 'ls', family, '-n', '50')))
+
+        # The family has more revisions than are listed
+        assert calls == {
+            'ecs.ListTaskDefinitions': 1,
+            'ecs.DescribeTaskDefinition': 50,
+        }
+        rows = [line.split(' ')[0] for line in results[-1].output.splitlines()
+                if line.startswith(family + ':')]
+        assert len(set(rows)) == len(rows) == 50 < HISTORY_REVISIONS
+
+    def test_group_deploy(self, benchmark, api_calls, fleet, mocker):
+        mocker.patch('ecstools.lib.utils.get_group_services',
+                     return_value=fleet.services)
+        mocker.patch('ecstools.lib.utils.monitor_deployment')
+        # Deploy another tag every round so that every round registers
+        tags = itertools.cycle(['v2', 'v3'])
+
+        calls = measure(
+            benchmark, api_calls,
+            lambda tag: run_cli(fleet, 'service', 'deploy', fleet.cluster,
+                                'group', tag, tag, tag, '-g', '-m', '8'),
+            rounds=2, setup=lambda: ((next(tags),), {}))
+
+        # Services of a family share one revision, which is described
+        # once. New revisions are not described.
+        assert calls == {
+            'ecs.DescribeServices': batches(fleet.size, 10),
+            'ecs.DescribeTaskDefinition': len(fleet.families),
+            'ecr.DescribeImages': len(REPOSITORIES),
+            'ecs.RegisterTaskDefinition': len(fleet.families),
+            'ecs.UpdateService': fleet.size,
+        }
@@ -1,4 +1,17 @@
+import sys
+import json
+import datetime
+
+import boto3
+import pytest
+
 import ecstools.main as main
+from ecstools.resources.service import Service
+from ecstools.commands.service.ls import print_services_info
+from ecstools.commands.service.env import read_env_file, \
+    set_environment_variables, delete_environment_variables, \
+    bulk_deploy_service
+from ecstools.tests.conftest import create_container_definitions
 
 
 class TestService(object):
@@ -25,6 +38,31 @@ class TestService(object):
             'production-app1:3' + (' ' * 34) + '0/1   '
         assert result.output == expected
 
+    def test_service_ls_all_stats_batched(self, mocker, capsys):
+        ecs = boto3.client('ecs', region_name='us-west-2')
+        ecs.create_cluster(clusterName='ls-batched')
+        ecs.register_task_definition(
+            family='ls-batched',
+            containerDefinitions=create_container_definitions('app1'),
+            cpu='256',
+            memory='512',
+        )
+        services = ['app%02d' % n for n in range(12)]
+        for service in services:
+            ecs.create_service(cluster='ls-batched', serviceName=service,
+                               taskDefinition='ls-batched', desiredCount=1)
+
+        describe_services = mocker.spy(ecs, 'describe_services')
+        describe_td = mocker.spy(ecs, 'describe_task_definition')
+        print_services_info(ecs, None, 'ls-batched', services)
+
+        assert describe_services.call_count == 2
+        assert describe_td.call_count == 1
+        lines = capsys.readouterr().out.splitlines()
+        assert [line.split()[0] for line in lines] == services
+        assert lines[0].split()[1:] == [
+            'ls-batched:1', '0/1', '256', '512', 'app1:v0.1']
+
     # TODO: moto raise exceptions not implemented
     # def test_service_ls_cluster_not_found(self, runner):
     #     result = runner.invoke(main.cli, ['service', 'ls', 'nonexistent'])
@@ -81,6 +119,90 @@ class TestService(object):
         expected = 'No updates'
         assert expected in result.output
 
+    def test_service_env_group_from_file(self, runner, mocker, tmpdir):
+        mocker.patch('ecstools.lib.utils.get_group_services',
+                     return_value=['app2', 'app1'])
+        env_file = tmpdir.join('.env')
+        env_file.write('# Comment\nexport TEST="1234"\n\nNEW=value\n')
+        result = runner.invoke(
+            main.cli,
+            ['service', 'env', 'production', 'group', '-g', '-c', 'app1',
+             '-f', str(env_file)],
+            input='n\n'
+        )
+        assert result.exit_code == 0
+        diff = '- TEST=123\n+ TEST=1234\n+ NEW=value\n'
+        assert result.output.index('production app2') < \
+            result.output.index('production app1')
+        assert result.output.count(diff) == 2
+
+    def test_service_env_unknown_container(self, runner):
+        result = runner.invoke(
+            main.cli,
+            ['service', 'env', 'production', 'app1', 'TEST=1', '-c', 'nope']
+        )
+        assert result.exit_code == 1
+        assert 'Container nope not found in app1.' in result.output
+
+    def test_service_env_yes_deploys_without_asking(self, runner, mocker):
+        deploy = mocker.patch(
+            'ecstools.commands.service.env.bulk_deploy_service',
+            return_value=(['app1'], []))
+        mocker.patch('ecstools.lib.utils.monitor_deployment')
+        result = runner.invoke(
+            main.cli,
+            ['service', 'env', 'production', 'app1', 'TEST=1', '-y']
+        )
+        assert result.exit_code == 0
+        assert 'Do you want to deploy' not in result.output
+        assert {'name': 'TEST', 'value': '1'} in \
+            deploy.call_args[0][0][0]['new_envs']
+
+    def test_bulk_deploy_service_isolates_failures(self, mocker, capsys):
+        td = mocker.Mock(**{'revision.return_value': 'app:2'})
+        services = [{'srv': mocker.Mock(**{'name.return_value': name,
+                                           'cluster.return_value': 'prod'}),
+                     'pending_deploy': True}
+                    for name in ('app1', 'app2', 'app3')]
+
+        def deploy(service):
+            if service['srv'].name() == 'app2':
+                sys.exit(1)
+            return td, service['srv'].name() == 'app3'
+
+        mocker.patch('ecstools.commands.service.env.deploy_service',
+                     side_effect=deploy)
+        assert bulk_deploy_service(services, 3) == (['app1', 'app3'],
+                                                    ['app2'])
+        assert capsys.readouterr().out == \
+            'Registered new task definition: app:2\n' \
+            'Deploying app:2 to prod app1...\n' \
+            'Reusing task definition: app:2\n' \
+            'Deploying app:2 to prod app3...\n'
+
+    def test_read_env_file_json(self, tmpdir):
+        env_file = tmpdir.join('env.json')
+        env_file.write('{"B": 2, "A": "x=y", "C": true, "D": null, '
+                       '"E": 1.5}')
+        assert read_env_file(str(env_file)) == \
+            ['B=2', 'A=x=y', 'C=true', 'D=null', 'E=1.5']
+
+    def test_read_env_file_json_rejects_objects(self, tmpdir, capsys):
+        env_file = tmpdir.join('env.json')
+        env_file.write('{"A": {"nested": 1}}')
+        with pytest.raises(SystemExit):
+            read_env_file(str(env_file))
+        assert 'The value of A' in capsys.readouterr().err
+
+    def test_set_and_delete_environment_variables(self):
+        envs = [{'name': 'A', 'value': '1'}, {'name': 'B', 'value': '2'}]
+        envs = set_environment_variables(['B=3', 'C=4', 'C=5'], envs)
+        assert envs == [{'name': 'A', 'value': '1'},
+                        {'name': 'B', 'value': '3'},
+                        {'name': 'C', 'value': '5'}]
+        envs = delete_environment_variables(['A', 'C=5', 'D'], envs)
+        assert envs == [{'name': 'B', 'value': '3'}]
+
     # def test_service_deploy_the_same_tag(self, runner, mocker):
     #     mocked_exit = mocker.patch(
     #         'ecstools.lib.utils.deployment_completed')
@@ -112,6 +234,64 @@ class TestService(object):
         expected = 'Error: Service group not in config file.\n'
         assert result.output == expected
 
+    def test_service_deploy_group_reports_failures(self, runner, mocker):
+        mocker.patch('ecstools.lib.utils.get_group_services',
+                     return_value=['app1', 'missing', 'app2'])
+        # The monitor exits once the deployed services completed
+        monitor = mocker.patch('ecstools.lib.utils.monitor_deployment',
+                               side_effect=SystemExit(
+                                   'All deployments completed.'))
+        result = runner.invoke(
+            main.cli,
+            ['service', 'deploy', 'production', 'group', 'v0.1', '-g',
+             '-m', '2']
+        )
+        assert result.exit_code == 2
+        assert monitor.call_args[0][3] == ['app1', 'app2']
+        assert result.output.endswith('Error: Failed to deploy missing.\n')
+
+    def test_service_deploy_group_prefetch_failure(self, runner, mocker):
+        mocker.patch('ecstools.lib.utils.get_group_services',
+                     return_value=['app1', 'app2'])
+        monitor = mocker.patch('ecstools.lib.utils.monitor_deployment')
+        requests = Service.image_digest_requests
+
+        def fail_app2(srv, tags):
+            if srv.name() == 'app2':
+                sys.exit(1)
+            return requests(srv, tags)
+
+        mocker.patch.object(Service, 'image_digest_requests', autospec=True,
+                            side_effect=fail_app2)
+        result = runner.invoke(
+            main.cli,
+            ['service', 'deploy', 'production', 'group', 'v0.1', '-g']
+        )
+        assert result.exit_code == 2
+        assert monitor.call_args[0][3] == ['app1']
+        assert result.output.endswith('Error: Failed to deploy app2.\n')
+
+    def test_service_deploy_manifest_waves(self, runner, mocker, tmpdir):
+        manifest = tmpdir.join('fleet.json')
+        manifest.write(json.dumps({'tags': ['v0.1'], 'targets': [
+            {'cluster': 'production', 'service': 'app2',
+             'after': ['production/app1']},
+            {'cluster': 'production', 'service': 'app1'},
+        ]}))
+        wait = mocker.patch('ecstools.lib.utils.wait_for_deployments',
+                            return_value=True)
+        monitor = mocker.patch('ecstools.lib.utils.monitor_fleet_deployment')
+        result = runner.invoke(
+            main.cli,
+            ['service', 'deploy', '--manifest', str(manifest)]
+        )
+        assert result.exit_code == 0
+        assert 'Wave 1/2: production/app1\nWave 2/2: production/app2\n' \
+            == result.output
+        assert wait.call_args[0][1] == [('production', 'app1')]
+        assert monitor.call_args[0][2] == [('production', 'app1'),
+                                           ('production', 'app2')]
+
     # TODO: Create moto ecr to validate the new tag
     # def test_service_deploy_new_tag(self, runner, mocker):
     #     mocked_exit = mocker.patch(
@@ -124,6 +304,25 @@ class TestService(object):
     #     assert 'Elapsed:' in result.output
     #     assert 'production app1  0/1' in result.output
 
+    def test_service_events(self, runner, mocker):
+        created = datetime.datetime(2021, 1, 1, 12, 0, 0, 123)
+        description = {
+            'serviceName': 'app1',
+            'serviceArn': 'arn:aws:ecs:service/app1',
+            'taskDefinition': 'production-app1:1',
+            'events': [{'id': str(i), 'createdAt': created,
+                        'message': 'event %s' % i} for i in (3, 2, 1)],
+        }
+        mocker.patch('ecstools.lib.poller.describe_services',
+                     return_value={'app1': description})
+        result = runner.invoke(
+            main.cli,
+            ['service', 'events', 'production', 'app1', '-n', '2']
+        )
+        assert result.exit_code == 0
+        assert result.output == '2021-01-01 12:00:00 event 2\n' \
+            '2021-01-01 12:00:00 event 3\n'
+
     def test_service_deploy_no_tags(self, runner):
         result = runner.invoke(
             main.cli,
@@ -173,6 +372,23 @@ class TestService(object):
     #     assert 'production app1  0/1' in result.output
     #     assert 'production app2  0/1' in result.output
 
+    def test_service_top_jsonl(self, runner, mocker):
+        mocked_exit = mocker.patch(
+            'ecstools.lib.utils.all_deployments_completed')
+        mocked_exit.return_value = True
+        result = runner.invoke(
+            main.cli,
+            ['service', 'top', 'production', 'app1', '-e', '-o', 'jsonl']
+        )
+        assert result.exit_code == 1
+        record = json.loads(result.output.splitlines()[0])
+        assert record['cluster'] == 'production'
+        assert record['service'] == 'app1'
+        assert record['desired'] == 1
+        assert record['deployments'][0]['taskDefinition'] == \
+            'production-app1:3'
+        assert 'All deployments completed.' in result.output
+
     def test_service_top_group_nonexistent(self, runner):
         result = runner.invoke(
             main.cli,
@@ -1,4 +1,8 @@
+import boto3
+
 import ecstools.main as main
+from ecstools.resources.task_definition import TaskDefinition
+from ecstools.tests.conftest import create_container_definitions
 
 
 class TestTaskDefinition(object):
@@ -44,3 +48,26 @@ class TestTaskDefinition(object):
         )
         expected = 'production-app1:1\n'
         assert result.output == expected
+
+    def test_task_definition_ls_revisions_details(self, runner, mocker):
+        ecs = boto3.client('ecs', region_name='us-west-2')
+        for n in range(3):
+            ecs.register_task_definition(
+                family='ls-details',
+                cpu='256',
+                memory='512',
+                containerDefinitions=create_container_definitions('app1'),
+            )
+        spy = mocker.spy(TaskDefinition, '__init__')
+
+        result = runner.invoke(
+            main.cli,
+            ['-r', 'us-west-2', 'task-definition', 'ls', '-n', '2',
+             'ls-details']
+        )
+        expected = 'ls-details:1 cpu: 256 memory: 512\n' \
+            '  - app1 0 - app1:v0.1\n' \
+            'ls-details:2 cpu: 256 memory: 512\n' \
+            '  - app1 0 - app1:v0.1\n'
+        assert result.output == expected
+        assert spy.call_count == 2
@@ -1,7 +1,9 @@
+import json
+
 import pytest
 import boto3
 from click.testing import CliRunner
-from moto import mock_ecs
+from moto import mock_ecs, mock_ecr
 
 
 @pytest.yield_fixture(scope='session')
@@ -12,6 +14,18 @@ def runner():
     yield CliRunner()
 
 
+@pytest.yield_fixture(scope='session', autouse=True)
+def cache_dir(tmp_path_factory):
+    """
+    Keeps the on-disk caches of cli runs out of the home directory.
+    """
+    from ecstools.lib import cache
+    original = cache.cache_dir
+    cache.cache_dir = str(tmp_path_factory.mktemp('cache'))
+    yield cache.cache_dir
+    cache.cache_dir = original
+
+
 @pytest.yield_fixture(scope='session', autouse=True)
 def ecs():
     """
@@ -20,8 +34,13 @@ def ecs():
     See https://github.com/spulec/moto/issues/620#issuecomment-224339087
     """
     mock_ecs().start()
+    mock_ecr().start()
     conn = boto3.client('ecs', region_name='us-east-1')
 
+    ecr = boto3.client('ecr', region_name='us-east-1')
+    ecr.create_repository(repositoryName='app1')
+    push_image(ecr, 'app1', 'v0.1')
+
     conn.create_cluster(clusterName='production')
     conn.create_cluster(clusterName='staging')
     conn.create_cluster(clusterName='development')
@@ -42,9 +61,21 @@ def ecs():
         )
 
     yield
+    mock_ecr().stop()
     mock_ecs().stop()
 
 
+def push_image(ecr, repository, tag, layer='app'):
+    """Put an image manifest. Images with the same `layer` share a digest."""
+    manifest = json.dumps({
+        'schemaVersion': 2,
+        'config': {'digest': 'sha256:' + layer},
+        'layers': [],
+    })
+    ecr.put_image(repositoryName=repository, imageManifest=manifest,
+                  imageTag=tag)
+
+
 def create_container_definitions(image):
     img_uri = '123456789012.dkr.ecr.us-east-1.amazonaws.com/' + image + ':v0.1'
     return [
@@ -0,0 +1,142 @@
+import os
+import boto3
+
+from ecstools.lib import cache
+from ecstools.lib.cache import TaskDefinitionCache, TaskDefinitionIndex, \
+    DiskStore, MetadataCache
+from ecstools.resources.task_definition import TaskDefinition
+from ecstools.tests.conftest import create_container_definitions
+
+
+class TestTaskDefinitionCache(object):
+    def test_qualified_revisions_are_described_once(self, mocker):
+        ecs = boto3.client('ecs', region_name='us-west-2')
+        ecs.register_task_definition(
+            family='cache-app',
+            containerDefinitions=create_container_definitions('app1'),
+        )
+        spy = mocker.spy(ecs, 'describe_task_definition')
+
+        td = TaskDefinition(ecs, 'cache-app')
+        TaskDefinition(ecs, td.arn())
+        TaskDefinition(ecs, td.revision())
+        assert spy.call_count == 1
+
+        # Unqualified family names always resolve through the API
+        TaskDefinition(ecs, 'cache-app')
+        assert spy.call_count == 2
+
+    def test_disk_store_round_trip(self, tmpdir):
+        ecs = boto3.client('ecs', region_name='us-west-2')
+        td = ecs.register_task_definition(
+            family='cache-disk',
+            containerDefinitions=create_container_definitions('app1'),
+        )['taskDefinition']
+
+        TaskDefinitionCache(disk=DiskStore(str(tmpdir))).set(ecs, td)
+        cache = TaskDefinitionCache(disk=DiskStore(str(tmpdir)))
+        cached = cache.get(ecs, td['taskDefinitionArn'])
+        assert cached == td
+        assert cache.get(ecs, 'cache-disk:%s' % td['revision']) == td
+
+    def test_tags_are_kept_apart(self, mocker):
+        ecs = boto3.client('ecs', region_name='us-west-2')
+        arn = ecs.register_task_definition(
+            family='cache-tags',
+            containerDefinitions=create_container_definitions('app1'),
+            tags=[{'key': 'team', 'value': 'web'}],
+        )['taskDefinition']['taskDefinitionArn']
+        mocker.patch.object(cache.task_definition_tags, 'memory', {})
+
+        td = TaskDefinition(ecs, arn)
+        assert 'tags' not in cache.task_definitions.get(ecs, arn)
+        assert td.copy_task_definition()['tags'] == \
+            [{'key': 'team', 'value': 'web'}]
+
+        # Later runs look up the current tags of cached revisions
+        retagged = [{'key': 'team', 'value': 'api'}]
+        list_tags = mocker.patch.object(ecs, 'list_tags_for_resource',
+                                        return_value={'tags': retagged})
+        cache.task_definition_tags.memory.clear()
+        assert TaskDefinition(ecs, arn).copy_task_definition()['tags'] == \
+            retagged
+        list_tags.assert_called_once_with(resourceArn=arn)
+
+    def test_disk_store_evicts_oldest(self, tmpdir, mocker):
+        store = DiskStore(str(tmpdir), maxsize=10)
+        keys = [str(n) for n in range(11)]
+        for mtime, key in enumerate(keys):
+            store.set(key, key)
+            os.utime(store._filename(key), (mtime, mtime))
+        assert [store.get(key) for key in keys] == [None] * 2 + keys[2:]
+
+        # Writes below the bound do not list the directory
+        scandir = mocker.spy(os, 'scandir')
+        store.set('11', '11')
+        assert scandir.call_count == 0
+
+    def test_disk_store_only_when_enabled(self, tmpdir, mocker):
+        mocker.patch.object(cache, 'cache_dir', str(tmpdir))
+        for obj, attr in [(cache.task_definitions, 'disk'),
+                          (cache.task_definition_index, 'disk'),
+                          (cache.task_definition_index, 'namespace'),
+                          (cache.image_digests, 'metadata'),
+                          (cache.task_definition_tags, 'metadata')]:
+            mocker.patch.object(obj, attr, getattr(obj, attr))
+
+        cache.configure('default', 'us-west-2')
+        assert cache.task_definitions.disk is None
+        cache.configure('default', 'us-west-2', offline=True)
+        assert cache.task_definitions.disk.path == \
+            os.path.join(str(tmpdir), 'task-definitions')
+
+
+class TestTaskDefinitionIndex(object):
+    def test_profiles_do_not_share_entries(self, tmpdir):
+        ecs = boto3.client('ecs', region_name='us-west-2')
+        staging = TaskDefinitionIndex(DiskStore(str(tmpdir)), 'staging')
+        production = TaskDefinitionIndex(DiskStore(str(tmpdir)),
+                                         'production')
+
+        staging.set(ecs, 'digest', 'arn:staging')
+        assert staging.get_stored(ecs, 'digest') == 'arn:staging'
+        assert production.get(ecs, 'digest') is None
+        assert production.get_stored(ecs, 'digest') is None
+
+
+class TestMetadataCache(object):
+    def cache(self, tmpdir, ttl, **kwargs):
+        return MetadataCache(str(tmpdir.join('metadata.db')), 'default/test',
+                             ttls={'clusters': ttl}, **kwargs)
+
+    def test_responses_are_served_within_ttl(self, tmpdir, mocker):
+        fetch = mocker.Mock(return_value=['production'])
+        cache = self.cache(tmpdir, 60)
+        assert cache.get_or_fetch('clusters', 'all', fetch) == ['production']
+        assert cache.get_or_fetch('clusters', 'all', fetch) == ['production']
+        assert fetch.call_count == 1
+
+        time = mocker.patch('ecstools.lib.cache.time.time')
+        time.return_value = 10 ** 10
+        cache.get_or_fetch('clusters', 'all', fetch)
+        assert fetch.call_count == 2
+
+    def test_zero_ttl_is_not_stored(self, tmpdir):
+        self.cache(tmpdir, 0).set('clusters', 'all', ['production'])
+        assert self.cache(tmpdir, 0).get('clusters', 'all') is None
+        offline = self.cache(tmpdir, 0, offline=True)
+        assert offline.get('clusters', 'all') is None
+
+        self.cache(tmpdir, 60).set('clusters', 'all', ['production'])
+        assert offline.get('clusters', 'all') == ['production']
+
+    def test_refresh_skips_cached_responses(self, tmpdir):
+        self.cache(tmpdir, 60).set('clusters', 'all', ['production'])
+        cache = self.cache(tmpdir, 60, refresh=True)
+        assert cache.get('clusters', 'all') is None
+
+    def test_iterate_caches_exhausted_generators(self, tmpdir):
+        cache = self.cache(tmpdir, 60)
+        assert list(cache.iterate('clusters', 'all',
+                                  lambda: iter(['a', 'b']))) == ['a', 'b']
+        assert list(cache.iterate('clusters', 'all', None)) == ['a', 'b']
@@ -0,0 +1,41 @@
+import click
+
+import ecstools.lib.cli as cli
+import ecstools.main as main
+
+
+@click.command()
+def hello():
+    """Plugin command"""
+    click.echo('hello')
+
+
+class EntryPoint(object):
+    name = 'hello'
+
+    def load(self):
+        return hello
+
+
+class TestSubcommand(object):
+    def test_commands_are_loaded_once(self, mocker):
+        group = main.ServiceCommand()
+        command = group.get_command(None, 'ls')
+        assert command.name == 'ls'
+
+        spy = mocker.spy(cli.importlib, 'import_module')
+        assert group.get_command(None, 'ls') is command
+        assert main.ServiceCommand().get_command(None, 'ls') is command
+        assert group.list_commands(None)[0] == 'deploy'
+        assert spy.call_count == 0
+
+    def test_entry_point_commands(self, runner, mocker):
+        mocker.patch('ecstools.lib.cli.entry_points',
+                     return_value=[EntryPoint()])
+        mocker.patch.dict(cli.Subcommand._registries, clear=True)
+        group = main.ClusterCommand()
+        # Cache the plugin modules first, as listing the group does
+        group.get_command(None, 'ls')
+        assert group.list_commands(None) == ['hello', 'ls', 'top']
+        result = runner.invoke(group, ['hello'])
+        assert result.output == 'hello\n'
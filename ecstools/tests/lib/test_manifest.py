@@ -0,0 +1,63 @@
+import pytest
+
+from ecstools.lib.manifest import Manifest, load_manifest
+
+
+def names(waves):
+    return [[t.name() for t in wave] for wave in waves]
+
+
+class TestManifest(object):
+    def test_waves_follow_dependencies(self):
+        manifest = Manifest({
+            'tags': ['v1'],
+            'targets': [
+                {'cluster': 'production', 'services': ['app1', 'app2'],
+                 'after': ['staging']},
+                {'cluster': 'staging', 'services': ['app1', 'app2']},
+                {'cluster': 'production', 'service': 'worker',
+                 'after': ['production/app1'], 'tags': 'v2'},
+            ],
+        })
+        assert names(manifest.waves()) == [
+            ['staging/app1', 'staging/app2'],
+            ['production/app1', 'production/app2'],
+            ['production/worker'],
+        ]
+        assert manifest.targets[-1].tags == ['v2']
+
+    def test_cluster_limits(self):
+        manifest = Manifest({'tags': ['v1'], 'max-parallel': 3,
+                             'cluster-max-parallel': {'production': 1},
+                             'targets': []})
+        assert manifest.cluster_limit('production') == 1
+        assert manifest.cluster_limit('staging') == 3
+
+    @pytest.mark.parametrize('limits', [
+        {'max-parallel': 0},
+        {'max-parallel': '2'},
+        {'cluster-max-parallel': {'production': 0}},
+        {'cluster-max-parallel': {'production': True}},
+        {'cluster-max-parallel': 2},
+    ])
+    def test_invalid_limits_exit(self, limits, capsys):
+        with pytest.raises(SystemExit):
+            Manifest(dict(limits, tags=['v1'], targets=[]))
+        assert 'Error: ' in capsys.readouterr().err
+
+    def test_circular_dependencies_exit(self):
+        manifest = Manifest({'tags': ['v1'], 'targets': [
+            {'cluster': 'a', 'service': 'app', 'after': ['b']},
+            {'cluster': 'b', 'service': 'app', 'after': ['a']},
+        ]})
+        with pytest.raises(SystemExit):
+            manifest.waves()
+
+    def test_load_yaml(self, tmpdir):
+        path = tmpdir.join('fleet.yaml')
+        path.write('tags: [v1]\n'
+                   'targets:\n'
+                   '  - cluster: staging\n'
+                   '    services: [app1]\n')
+        manifest = load_manifest(str(path))
+        assert names(manifest.waves()) == [['staging/app1']]
@@ -0,0 +1,36 @@
+from ecstools.lib.paginate import paginate
+
+
+def pages(*pages):
+    calls = []
+
+    def method(**params):
+        calls.append(params)
+        page = len(calls) - 1
+        response = {'items': pages[page]}
+        if page < len(pages) - 1:
+            response['nextToken'] = 'token-%s' % (page + 1)
+        return response
+
+    return method, calls
+
+
+class TestPaginate(object):
+    def test_yields_items_of_all_pages(self):
+        method, calls = pages(['a', 'b'], ['c'], ['d'])
+        assert list(paginate(method, 'items', cluster='x')) == \
+            ['a', 'b', 'c', 'd']
+        assert calls == [{'cluster': 'x'},
+                         {'cluster': 'x', 'nextToken': 'token-1'},
+                         {'cluster': 'x', 'nextToken': 'token-2'}]
+
+    def test_pages_are_fetched_lazily(self):
+        method, calls = pages(['a', 'b'], ['c'])
+        items = paginate(method, 'items')
+        assert next(items) == 'a'
+        assert len(calls) == 1
+
+    def test_limit(self):
+        method, calls = pages(['a', 'b'], ['c', 'd'], ['e'])
+        assert list(paginate(method, 'items', limit=3)) == ['a', 'b', 'c']
+        assert len(calls) == 2
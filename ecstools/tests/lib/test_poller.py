@@ -0,0 +1,98 @@
+import boto3
+
+from ecstools.lib.poller import ServicePoller, FleetPoller, PollInterval, \
+    EventTail
+from ecstools.tests.conftest import create_container_definitions
+
+
+class TestServicePoller(object):
+    def test_poll_batches_describe_services(self, mocker):
+        ecs = boto3.client('ecs', region_name='us-west-2')
+        ecs.create_cluster(clusterName='poller')
+        ecs.register_task_definition(
+            family='poller-app',
+            containerDefinitions=create_container_definitions('app1'),
+        )
+        services = ['app%s' % n for n in range(12)]
+        for service in services:
+            ecs.create_service(cluster='poller', serviceName=service,
+                               taskDefinition='poller-app', desiredCount=1)
+
+        spy = mocker.spy(ecs, 'describe_services')
+        snapshots = ServicePoller(ecs, 'poller', services).poll()
+
+        assert spy.call_count == 2
+        assert [s.name() for s in snapshots] == services
+        assert all(s.desired_count() == 1 for s in snapshots)
+
+
+class TestFleetPoller(object):
+    def test_poll_keeps_target_order_across_clusters(self, mocker):
+        ecs = boto3.client('ecs', region_name='us-west-2')
+        ecs.register_task_definition(
+            family='fleet-app',
+            containerDefinitions=create_container_definitions('app1'),
+        )
+        targets = [('fleet-b', 'app1'), ('fleet-a', 'app1'),
+                   ('fleet-b', 'app2')]
+        for cluster, service in targets:
+            ecs.create_cluster(clusterName=cluster)
+            ecs.create_service(cluster=cluster, serviceName=service,
+                               taskDefinition='fleet-app', desiredCount=1)
+
+        spy = mocker.spy(ecs, 'describe_services')
+        snapshots = FleetPoller(ecs, targets).poll()
+
+        assert spy.call_count == 2
+        assert [(s.cluster(), s.name()) for s in snapshots] == targets
+
+
+class Snapshot(object):
+    """Stands in for a Service snapshot with the events `ids`"""
+
+    def __init__(self, ids):
+        self._events = [{'id': str(i), 'message': 'event %s' % i}
+                        for i in reversed(ids)]
+
+    def arn(self):
+        return 'arn:service'
+
+    def events(self, number):
+        return self._events[:number]
+
+
+class TestEventTail(object):
+    def test_returns_only_new_events(self):
+        tail = EventTail(backlog=2)
+        assert [e['id'] for e in tail.update(Snapshot(range(5)))] == \
+            ['3', '4']
+        assert tail.update(Snapshot(range(5))) == []
+        assert [e['id'] for e in tail.update(Snapshot(range(8)))] == \
+            ['5', '6', '7']
+
+    def test_keeps_a_bounded_buffer(self):
+        tail = EventTail(size=3, backlog=1)
+        for n in range(1, 50):
+            tail.update(Snapshot(range(n)))
+        assert [e['id'] for e in tail.recent(Snapshot([]), 10)] == \
+            ['46', '47', '48']
+        assert [e['id'] for e in tail.recent(Snapshot([]), 1)] == ['48']
+
+
+class TestPollInterval(object):
+    def test_polls_at_interval_while_changing(self):
+        poll_interval = PollInterval(interval=2, idle_polls=3)
+        assert [poll_interval.next(True) for _ in range(5)] == [2] * 5
+
+    def test_backs_off_when_idle(self):
+        poll_interval = PollInterval(interval=1, max_interval=8, idle_polls=2)
+        delays = [poll_interval.next(False) for _ in range(8)]
+        assert delays[0] == 1
+        assert all(1 <= d <= 8 for d in delays)
+        assert delays[-1] > 4
+        assert poll_interval.next(True) == 1
+
+    def test_backs_off_on_throttling(self):
+        poll_interval = PollInterval(interval=1, max_interval=30)
+        assert 1 <= poll_interval.throttled() <= 2
+        assert 2 <= poll_interval.throttled() <= 4
@@ -0,0 +1,51 @@
+import curses
+
+from ecstools.lib.screen import Frame, Screen
+
+
+def frame(lines, cols=40):
+    f = Frame(cols)
+    for y, text in enumerate(lines):
+        f.addstr(y, 0, text)
+    return f
+
+
+class TestScreen(object):
+    def window(self, mocker, rows=5, cols=40):
+        scr = mocker.Mock()
+        scr.getmaxyx.return_value = (rows, cols)
+        return scr
+
+    def test_only_changed_lines_are_redrawn(self, mocker):
+        scr = self.window(mocker)
+        screen = Screen(scr)
+
+        screen.render(frame(['a', 'b', 'c']))
+        assert scr.addnstr.call_count == 3
+
+        scr.reset_mock()
+        screen.render(frame(['a', 'B', 'c']))
+        scr.addnstr.assert_called_once_with(1, 0, 'B', 40, curses.A_NORMAL)
+        scr.clear.assert_not_called()
+
+    def test_tall_frames_scroll_below_pinned_lines(self, mocker):
+        scr = self.window(mocker, rows=5)
+        screen = Screen(scr, pinned=1)
+        lines = ['header'] + ['line %s' % n for n in range(10)]
+
+        screen.render(frame(lines))
+        drawn = [c[0][2] for c in scr.addnstr.call_args_list]
+        assert drawn[:4] == ['header', 'line 0', 'line 1', 'line 2']
+        assert 'Lines 1-3 of 10' in drawn[4]
+
+        scr.reset_mock()
+        screen.handle_key(curses.KEY_END)
+        drawn = [c[0][2] for c in scr.addnstr.call_args_list]
+        assert drawn[:3] == ['line 7', 'line 8', 'line 9']
+        assert 'Lines 8-10 of 10' in drawn[3]
+
+    def test_newline_continues_on_next_line(self):
+        f = Frame(40)
+        f.addstr(0, 4, 'first\nsecond')
+        assert f.lines == [[(4, 'first', curses.A_NORMAL)],
+                           [(0, 'second', curses.A_NORMAL)]]
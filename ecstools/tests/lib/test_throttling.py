@@ -0,0 +1,52 @@
+import boto3
+import pytest
+
+from ecstools.lib.throttling import TokenBucket, RequestScheduler
+
+
+class TestTokenBucket(object):
+    def test_bursts_then_paces(self, mocker):
+        mocker.patch('ecstools.lib.throttling.time.monotonic',
+                     return_value=100.0)
+        sleep = mocker.patch('ecstools.lib.throttling.time.sleep')
+        bucket = TokenBucket(rate=2, burst=3)
+
+        assert [bucket.acquire() for _ in range(3)] == [0, 0, 0]
+        assert bucket.acquire() == 0.5
+        assert bucket.acquire() == 1.0
+        assert sleep.call_count == 2
+
+
+class TestRequestScheduler(object):
+    def test_counts_calls_and_throttling(self):
+        scheduler = RequestScheduler(max_concurrency=1)
+        ecs = boto3.client('ecs', region_name='us-west-2',
+                           config=scheduler.client_config())
+        scheduler.register(ecs, 'ecs')
+
+        # A slot which is not released would block the second call
+        ecs.list_clusters()
+        ecs.list_clusters()
+        assert scheduler.calls[('ecs', 'ListClusters')] == 2
+
+        scheduler._needs_retry(
+            'ecs', 'needs-retry.ecs.ListClusters',
+            response=(None, {'Error': {'Code': 'ThrottlingException'}}))
+        assert scheduler.throttled == {('ecs', 'ListClusters'): 1}
+
+    def test_failed_calls_release_their_slot(self):
+        scheduler = RequestScheduler(max_concurrency=1)
+        ecs = boto3.client('ecs', region_name='us-west-2',
+                           config=scheduler.client_config())
+        scheduler.register(ecs, 'ecs')
+
+        def fail(**kwargs):
+            raise RuntimeError('request preparation failed')
+
+        # Raises after the slot was taken, before any after-call event
+        ecs.meta.events.register_last('before-call', fail)
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                ecs.list_clusters()
+        ecs.meta.events.unregister('before-call', fail)
+        ecs.list_clusters()
@@ -0,0 +1,58 @@
+import boto3
+
+from ecstools.lib import trace
+from ecstools.lib.trace import ApiTracer, ApiCall, percentile
+
+
+class TestApiTracer(object):
+    def test_records_calls(self):
+        tracer = ApiTracer()
+        ecs = boto3.client('ecs', region_name='us-west-2')
+        tracer.register(ecs, 'ecs')
+
+        ecs.list_clusters()
+        ecs.list_clusters()
+        calls = tracer.operations()[('ecs', 'ListClusters')]
+        assert len(calls) == 2
+        assert all(c.size > 0 and c.retries == 0 and c.error is None
+                   for c in calls)
+
+    def test_network_time_counts_overlaps_once(self):
+        tracer = ApiTracer()
+        tracer.calls = [ApiCall('ecs', 'A', 0, 2), ApiCall('ecs', 'B', 1, 3),
+                        ApiCall('ecs', 'C', 5, 6)]
+        assert tracer.network_time() == 4
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        assert percentile(values, 50) == 50
+        assert percentile(values, 95) == 95
+        assert percentile([7], 95) == 7
+
+
+class TestTraceRecorder(object):
+    def test_nested_spans(self, tmp_path):
+        @trace.traced
+        def render():
+            with trace.span('draw', rows=2):
+                pass
+
+        recorder = trace.start_recording(str(tmp_path / 'trace.json'))
+        try:
+            render()
+        finally:
+            trace.stop_recording()
+
+        spans = dict((e['name'], e) for e in recorder.events
+                     if e['ph'] == 'X')
+        outer = spans['TestTraceRecorder.test_nested_spans.<locals>.render']
+        inner = spans['draw']
+        assert inner['args'] == {'rows': 2}
+        assert inner['tid'] == outer['tid']
+        assert outer['ts'] <= inner['ts']
+        assert inner['ts'] + inner['dur'] <= outer['ts'] + outer['dur']
+        assert (tmp_path / 'trace.json').exists()
+
+    def test_records_nothing_when_disabled(self):
+        assert trace.span('draw') is trace.NULL_SPAN
+        assert trace.traced(lambda: 42)() == 42
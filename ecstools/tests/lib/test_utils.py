@@ -0,0 +1,89 @@
+import json
+
+import boto3
+
+import ecstools.lib.utils as utils
+
+
+def target_group(name):
+    return 'arn:aws:elasticloadbalancing:us-east-1:123456789012:' \
+        'targetgroup/%s/0123456789abcdef' % name
+
+
+def load_balancer(name, port):
+    return {'targetGroupArn': target_group(name),
+            'containerName': 'app1', 'containerPort': port}
+
+
+def target_health(*states):
+    return {'TargetHealthDescriptions': [
+        {'TargetHealth': {'State': state}} for state in states]}
+
+
+class TestCollectTargetHealth(object):
+    def test_all_target_groups_described_once(self, mocker):
+        elbv2 = mocker.Mock()
+        elbv2.describe_target_health.side_effect = \
+            lambda TargetGroupArn: {
+                target_group('web'): target_health('healthy', 'healthy'),
+                target_group('admin'): target_health('unhealthy'),
+            }[TargetGroupArn]
+
+        app1 = mocker.Mock()
+        app1.arn.return_value = 'app1'
+        app1.load_balancers.return_value = [load_balancer('web', 80),
+                                            load_balancer('admin', 8080)]
+        app2 = mocker.Mock()
+        app2.arn.return_value = 'app2'
+        app2.load_balancers.return_value = [load_balancer('web', 80)]
+        worker = mocker.Mock()
+        worker.arn.return_value = 'worker'
+        worker.load_balancers.return_value = []
+
+        result = utils.collect_target_health(elbv2, [app1, app2, worker])
+
+        assert elbv2.describe_target_health.call_count == 2
+        assert [tg['group'] for tg in result['app1']] == ['web', 'admin']
+        assert result['app1'][0]['states'] == 'healthy: 2'
+        assert result['app1'][1]['healthy'] is False
+        assert [tg['port'] for tg in result['app2']] == [80]
+        assert result['worker'] == []
+
+
+def service(name, running, desired, deployments=1, rollout='COMPLETED'):
+    return {'serviceName': name, 'runningCount': running,
+            'desiredCount': desired,
+            'deployments': [{'rolloutState': rollout}] * deployments}
+
+
+class TestDashboard(object):
+    def test_services_needing_attention_first(self):
+        services = [
+            service('steady', 2, 2),
+            service('deploying', 1, 2, deployments=2),
+            service('failed', 2, 2, rollout='FAILED'),
+            service('crashing', 0, 2),
+            service('another-steady', 1, 1),
+        ]
+        rows = sorted(services, key=utils.dashboard_sort_key)
+        assert [r['serviceName'] for r in rows] == [
+            'failed', 'crashing', 'deploying', 'another-steady', 'steady']
+
+
+class TestWaitForDeployments(object):
+    def test_times_out_with_progress(self, capsys):
+        ecs = boto3.client('ecs', region_name='us-east-1')
+        assert not utils.wait_for_deployments(
+            ecs, [('production', 'app1')], interval=0.01, timeout=0.05)
+        err = capsys.readouterr().err
+        assert err.startswith('Waiting: production/app1 InProgress 0/1\n')
+        assert 'did not complete within 0.05s: production/app1.' in err
+
+    def test_jsonl_progress(self, capsys):
+        ecs = boto3.client('ecs', region_name='us-east-1')
+        utils.wait_for_deployments(ecs, [('production', 'app1')],
+                                   interval=0.01, timeout=0.01,
+                                   output='jsonl')
+        record = json.loads(capsys.readouterr().out.splitlines()[0])
+        assert record['service'] == 'app1'
+        assert record['status'] == 'InProgress'
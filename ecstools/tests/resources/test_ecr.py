@@ -0,0 +1,34 @@
+import boto3
+import pytest
+
+from ecstools.resources.ecr import Ecr
+from ecstools.tests.conftest import push_image
+
+
+class TestEcr(object):
+    def test_resolve_digests_batches_per_repository(self, mocker):
+        ecr = boto3.client('ecr', region_name='us-west-2')
+        ecr.create_repository(repositoryName='resolve')
+        push_image(ecr, 'resolve', 'v1', layer='one')
+        push_image(ecr, 'resolve', 'v1-retag', layer='one')
+        push_image(ecr, 'resolve', 'v2', layer='two')
+        spy = mocker.spy(ecr, 'describe_images')
+
+        images = [('resolve', 'v1'), ('resolve', 'v1-retag'),
+                  ('resolve', 'v2'), ('resolve', 'missing')]
+        digests = Ecr(ecr).resolve_digests(images, missing_ok=True)
+        assert digests[('resolve', 'v1')] == digests[('resolve', 'v1-retag')]
+        assert digests[('resolve', 'v1')] != digests[('resolve', 'v2')]
+        assert digests[('resolve', 'missing')] is None
+        # One batch, then one call per tag to find the missing one
+        assert spy.call_count == 5
+
+        spy.reset_mock()
+        Ecr(ecr).resolve_digests(images[:3])
+        assert spy.call_count == 0
+
+    def test_missing_image_exits(self):
+        ecr = boto3.client('ecr', region_name='us-west-2')
+        ecr.create_repository(repositoryName='resolve-missing')
+        with pytest.raises(SystemExit):
+            Ecr(ecr).resolve_digests([('resolve-missing', 'v1')])
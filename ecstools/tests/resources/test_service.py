@@ -0,0 +1,193 @@
+import boto3
+import pytest
+
+from ecstools.lib import cache
+from ecstools.lib.throttling import RequestScheduler
+from ecstools.resources.service import Service
+from ecstools.resources.task_definition import content_hash
+from ecstools.tests.conftest import create_container_definitions, push_image
+
+
+class TestService(object):
+    def test_loads_lazily(self, mocker):
+        ecs = boto3.client('ecs', region_name='us-east-1')
+        cache.task_definitions.memory.clear()
+        describe_services = mocker.spy(ecs, 'describe_services')
+        describe_td = mocker.spy(ecs, 'describe_task_definition')
+
+        srv = Service(ecs, None, 'production', 'app1')
+        assert srv.name() == 'app1'
+        assert describe_services.call_count == 0
+
+        assert srv.desired_count() == 1
+        srv.running_count()
+        assert describe_services.call_count == 1
+        assert describe_td.call_count == 0
+
+        assert srv.task_definition().name() == 'production-app1'
+        srv.images()
+        assert describe_td.call_count == 1
+
+    def test_from_description(self, mocker):
+        ecs = boto3.client('ecs', region_name='us-east-1')
+        description = ecs.describe_services(
+            cluster='production', services=['app1'])['services'][0]
+        describe_services = mocker.spy(ecs, 'describe_services')
+
+        srv = Service(ecs, None, 'production', 'app1',
+                      description=description)
+        assert srv.arn() == description['serviceArn']
+        assert describe_services.call_count == 0
+
+    def test_deploy_round_trips(self):
+        ecs = boto3.client('ecs', region_name='us-east-1')
+        ecr = boto3.client('ecr', region_name='us-east-1')
+        ecs.create_cluster(clusterName='hotfix')
+        ecs.register_task_definition(
+            family='hotfix-app',
+            containerDefinitions=create_container_definitions('app1'),
+            tags=[{'key': 'team', 'value': 'web'}])
+        ecs.create_service(cluster='hotfix', serviceName='app',
+                           taskDefinition='hotfix-app', desiredCount=1)
+        push_image(ecr, 'app1', 'hotfix', layer='hotfix')
+        cache.task_definitions.memory.clear()
+        cache.image_digests.memory.clear()
+        scheduler = RequestScheduler(rates={'ecs': 10 ** 6, 'ecr': 10 ** 6})
+        scheduler.register(ecs, 'ecs')
+        scheduler.register(ecr, 'ecr')
+
+        Service(ecs, ecr, 'hotfix', 'app').deploy_tags(['hotfix'], None,
+                                                       False)
+        assert dict(scheduler.calls) == {
+            ('ecs', 'DescribeServices'): 1,
+            ('ecs', 'DescribeTaskDefinition'): 1,
+            ('ecr', 'DescribeImages'): 1,
+            ('ecs', 'RegisterTaskDefinition'): 1,
+            ('ecs', 'UpdateService'): 1,
+        }
+        # Tags are copied to the new revision
+        assert ecs.describe_task_definition(
+            taskDefinition='hotfix-app:2', include=['TAGS'])['tags'] == \
+            [{'key': 'team', 'value': 'web'}]
+
+
+class TestDeployTags(object):
+    @pytest.fixture
+    def srv(self):
+        ecs = boto3.client('ecs', region_name='us-east-1')
+        ecr = boto3.client('ecr', region_name='us-east-1')
+        ecs.create_cluster(clusterName='retag')
+        ecs.register_task_definition(
+            family='retag-app',
+            containerDefinitions=create_container_definitions('app1'))
+        ecs.create_service(cluster='retag', serviceName='app',
+                           taskDefinition='retag-app', desiredCount=1)
+        cache.image_digests.memory.clear()
+        yield Service(ecs, ecr, 'retag', 'app')
+        ecs.delete_service(cluster='retag', service='app', force=True)
+
+    def test_new_tag_of_the_same_image_is_registered(self, srv, mocker):
+        # The same image as v0.1
+        push_image(srv.ecr, 'app1', 'release-2')
+        update = mocker.spy(srv.ecs, 'update_service')
+
+        srv.deploy_tags(['release-2'], None, False)
+        td = update.call_args[1]['taskDefinition']
+        assert td != srv.task_definition().revision()
+        image = srv.ecs.describe_task_definition(taskDefinition=td)[
+            'taskDefinition']['containerDefinitions'][0]['image']
+        assert image.endswith('/app1:release-2')
+
+    def test_moved_tag_is_redeployed(self, srv, mocker, capsys):
+        arn = srv.task_definition().arn()
+        mocker.patch.object(srv.ecs, 'list_tasks',
+                            return_value={'taskArns': ['task']})
+        mocker.patch.object(srv.ecs, 'describe_tasks', return_value={
+            'tasks': [{'taskDefinitionArn': arn, 'containers': [
+                {'name': 'app1', 'imageDigest': 'sha256:old'}]}]})
+        register = mocker.spy(srv.ecs, 'register_task_definition')
+        update = mocker.spy(srv.ecs, 'update_service')
+
+        srv.deploy_tags(['v0.1'], None, True)
+        assert register.call_count == 0
+        assert update.call_args[1]['taskDefinition'] == \
+            srv.task_definition().revision()
+        assert 'The tags of app1 point to new images.' in \
+            capsys.readouterr().out
+
+
+class TestTaskDefinitionReuse(object):
+    @pytest.fixture
+    def srv(self, tmp_path, mocker):
+        mocker.patch.object(cache.task_definition_index, 'memory', {})
+        mocker.patch.object(cache.task_definition_index, 'disk',
+                            cache.DiskStore(str(tmp_path)))
+        ecs = boto3.client('ecs', region_name='us-east-1')
+        ecs.create_cluster(clusterName='reuse')
+        ecs.register_task_definition(
+            family='reuse-app',
+            containerDefinitions=create_container_definitions('app1'))
+        ecs.create_service(cluster='reuse', serviceName='app',
+                           taskDefinition='reuse-app', desiredCount=1)
+        yield Service(ecs, None, 'reuse', 'app')
+        ecs.delete_service(cluster='reuse', service='app', force=True)
+
+    @staticmethod
+    def with_env(srv, value):
+        td_dict = srv.task_definition().copy_task_definition()
+        td_dict['containerDefinitions'][0]['environment'] = [
+            {'name': 'VALUE', 'value': value}]
+        return td_dict
+
+    def test_reuses_revision_of_this_run(self, srv, mocker):
+        register = mocker.spy(srv.ecs, 'register_task_definition')
+        first = srv.register_task_definition(self.with_env(srv, 'a'), False)
+        second = srv.register_task_definition(self.with_env(srv, 'a'), False)
+        assert first.arn() == second.arn()
+        assert register.call_count == 1
+
+    def test_reuses_stored_active_revision(self, srv, mocker):
+        td_a = srv.register_task_definition(self.with_env(srv, 'a'), False)
+        srv.update_service(cluster='reuse', service='app',
+                           taskDefinition=td_a.arn())
+
+        # Another run deploys b and then flips back to a
+        cache.task_definition_index.memory.clear()
+        srv = Service(srv.ecs, None, 'reuse', 'app')
+        srv.register_task_definition(self.with_env(srv, 'b'), False)
+        cache.task_definition_index.memory.clear()
+        register = mocker.spy(srv.ecs, 'register_task_definition')
+        assert srv.register_task_definition(
+            self.with_env(srv, 'a'), False).arn() == td_a.arn()
+        assert register.call_count == 0
+
+        # Deregistered revisions are described as inactive
+        cache.task_definition_index.memory.clear()
+        describe = srv.ecs.describe_task_definition
+
+        def describe_inactive(taskDefinition):
+            response = describe(taskDefinition=taskDefinition)
+            if taskDefinition == td_a.arn():
+                response['taskDefinition']['status'] = 'INACTIVE'
+            return response
+
+        mocker.patch.object(srv.ecs, 'describe_task_definition',
+                            side_effect=describe_inactive)
+        assert srv.register_task_definition(
+            self.with_env(srv, 'a'), False).arn() != td_a.arn()
+        assert register.call_count == 1
+
+
+class TestContentHash(object):
+    def test_ignores_order_and_empty_values(self):
+        td = {'family': 'app', 'volumes': [], 'containerDefinitions': [{
+            'name': 'app', 'environment': [{'name': 'A', 'value': '1'},
+                                           {'name': 'B', 'value': '2'}]}]}
+        same = {'containerDefinitions': [{
+            'environment': [{'value': '2', 'name': 'B'},
+                            {'value': '1', 'name': 'A'}],
+            'name': 'app'}], 'family': 'app'}
+        assert content_hash(td) == content_hash(same)
+
+        same['containerDefinitions'][0]['environment'][0]['value'] = '3'
+        assert content_hash(td) != content_hash(same)
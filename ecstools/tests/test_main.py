@@ -1,3 +1,11 @@
+import sys
+import json
+import time
+import subprocess
+
+import boto3
+import pytest
+
 import ecstools.main as main
 
 version = '0.2.7'
@@ -35,3 +43,76 @@ class TestMain(object):
         assert result.exit_code == 1
         expected = 'You must specify a region.\n'
         assert result.output == expected
+
+    def test_clients_are_created_on_first_use(self, runner, mocker):
+        spy = mocker.spy(boto3.session.Session, 'client')
+        result = runner.invoke(main.cli, ['cluster', 'ls'])
+        assert result.exit_code == 0
+        assert [c[0][1] for c in spy.call_args_list] == ['ecs']
+
+    def test_offline_uses_cached_responses(self, runner):
+        online = runner.invoke(main.cli, ['cluster', 'ls'])
+        offline = runner.invoke(main.cli, ['--offline', 'cluster', 'ls'])
+        assert offline.exit_code == 0
+        assert offline.output == online.output
+
+        result = runner.invoke(main.cli, ['--offline', 'service', 'ls',
+                                          'not-cached'])
+        assert result.exit_code == 1
+        assert 'not in the local cache' in result.output
+
+    def test_trace_api_summary(self, runner):
+        result = runner.invoke(main.cli, ['--trace-api', '--refresh',
+                                          'cluster', 'ls'])
+        assert result.exit_code == 0
+        assert 'ecs ListClusters' in result.output
+        assert 'waiting on AWS' in result.output
+
+    def test_trace_file(self, runner, tmp_path):
+        path = str(tmp_path / 'trace.json')
+        result = runner.invoke(main.cli, ['--trace-file', path, 'service',
+                                          'events', 'production', 'app1'])
+        assert result.exit_code == 0
+
+        with open(path) as f:
+            events = json.load(f)['traceEvents']
+        names = set(e['name'] for e in events if e['ph'] == 'X')
+        assert {'ServicePoller.poll', 'describe_services',
+                'ecs.DescribeServices'} <= names
+
+    @pytest.mark.parametrize('args', [
+        ['--help'],
+        ['cluster', '--help'],
+        ['service', '--help'],
+        ['task-definition', '--help'],
+    ])
+    def test_help_does_not_import_boto3(self, args):
+        code = 'import sys\n' \
+            'import ecstools.main as main\n' \
+            'try:\n' \
+            '    main.cli(%r)\n' \
+            'except SystemExit:\n' \
+            '    pass\n' \
+            'sys.stderr.write(str("boto3" in sys.modules or\n' \
+            '                     "botocore" in sys.modules))\n' % args
+        result = subprocess.run([sys.executable, '-c', code],
+                                stdout=subprocess.DEVNULL,
+                                stderr=subprocess.PIPE)
+        assert result.stderr.decode() == 'False'
+
+    def test_startup_time(self):
+        """
+        `ecs --help` should start faster than importing boto3 alone.
+        """
+        def best_of(args, runs=3):
+            timings = []
+            for _ in range(runs):
+                start = time.time()
+                subprocess.check_call([sys.executable] + args,
+                                      stdout=subprocess.DEVNULL)
+                timings.append(time.time() - start)
+            return min(timings)
+
+        boto3_import = best_of(['-c', 'import boto3'])
+        cli_help = best_of(['-m', 'ecstools.main', '--help'])
+        assert cli_help < boto3_import
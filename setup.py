@@ -9,7 +9,9 @@ with io.open(path.join(this_directory, 'README.md'), encoding='utf-8') as f:
 
 requirements = [
     'Click>=6.0',
-    'boto3>=1.5.33',
+    # Adaptive retries and the after-call-error event
+    'boto3>=1.12.0',
+    'botocore>=1.15.0',
     'reprint>=0.5.1',
     'configparser>=3.5.0'
 ]
@@ -28,6 +30,9 @@ setup(
 
     packages=find_packages(),
     install_requires=requirements,
+    extras_require={
+        'yaml': ['PyYAML>=5.1'],
+    },
     include_package_data=True,
     package_dir={'ecstools':
                  'ecstools'},